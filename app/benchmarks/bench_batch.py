@@ -0,0 +1,61 @@
+"""
+Detector throughput (frames per second) at several batch sizes, and the
+time to decode a batched head in one pass against frame by frame.
+
+The forward pass needs an ONNX export with a dynamic batch axis; the decode
+comparison runs on synthetic heads and needs no model. Run from the `app`
+directory:
+
+    python -m benchmarks.bench_batch [model.onnx [onnxruntime|opencv]]
+"""
+import sys
+import time
+import timeit
+
+import numpy as np
+
+from benchmarks.bench_decode import synthetic_output
+from detector import create_detector
+from postprocess import decode_batch, decode_predictions
+
+
+def timed(fn, number=20, repeat=5):
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1e3
+
+
+def bench_decode(batch_sizes, conf_threshold=0.25, iou_threshold=0.5):
+    rng = np.random.default_rng(0)
+    print("batch   per-frame decode (ms)   batched decode (ms)")
+    for batch_size in batch_sizes:
+        outputs = [synthetic_output(rng) for _ in range(batch_size)]
+        batch = np.concatenate(outputs)
+        per_frame = timed(lambda: [decode_predictions(o, conf_threshold, iou_threshold,
+                                                      classes=[0]) for o in outputs])
+        batched = timed(lambda: decode_batch(batch, conf_threshold, iou_threshold,
+                                             classes=[0]))
+        print(f"{batch_size:<7} {per_frame:>21.3f}   {batched:>19.3f}")
+
+
+def bench_forward(model_path, runtime, batch_sizes, frames=32):
+    rng = np.random.default_rng(0)
+    video = [rng.integers(0, 255, size=(720, 1280, 3), dtype=np.uint8)
+             for _ in range(frames)]
+    print("batch   fps")
+    for batch_size in batch_sizes:
+        detector = create_detector(runtime, model_path, batch_size=batch_size)
+        detector.infer_batch(video[:batch_size])  # warm up / load the model
+        start = time.perf_counter()
+        detector.infer_batch(video)
+        print(f"{batch_size:<7} {frames / (time.perf_counter() - start):.1f}")
+
+
+def main():
+    batch_sizes = (1, 2, 4, 8)
+    bench_decode(batch_sizes)
+    if len(sys.argv) > 1:
+        runtime = sys.argv[2] if len(sys.argv) > 2 else "onnxruntime"
+        bench_forward(sys.argv[1], runtime, batch_sizes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Capture in the processing thread against `capture.FrameSource`, with a
+stand-in detector that holds the thread (GIL released, like a TensorRT or
+onnxruntime forward pass) for a fixed time per frame:
+
+- a 720p video file read losslessly: frames per second, decode overlapping
+  inference in the threaded case;
+- a simulated 30 fps live camera that buffers unread frames, as RTSP
+  clients do, with inference slower than real time: how far behind real
+  time the processed frames are (inline keeps falling behind, "latest"
+  stays within about one frame time plus one inference).
+
+Run from the `app` directory:
+
+    python -m benchmarks.bench_capture
+"""
+import os
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from capture import FrameSource
+
+SHAPE = (720, 1280, 3)
+INFER = 0.012  # seconds per frame for the file test
+LIVE_INFER = 0.045  # slower than the camera's 33 ms frame time
+LIVE_SECONDS = 6
+
+
+def write_video(path, frames=300):
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 255, SHAPE, dtype=np.uint8)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 30, (SHAPE[1], SHAPE[0]))
+    for i in range(frames):
+        frame = background.copy()
+        cv2.rectangle(frame, (4 * i, 300), (4 * i + 60, 450), (0, 255, 0), -1)
+        writer.write(frame)
+    writer.release()
+
+
+def infer(seconds):
+    time.sleep(seconds)
+
+
+def file_inline(path):
+    cap, frames = cv2.VideoCapture(path), 0
+    start = time.perf_counter()
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        infer(INFER)
+        frames += 1
+    cap.release()
+    return frames / (time.perf_counter() - start)
+
+
+def file_threaded(path):
+    cap, frames = FrameSource(path, mode="lossless"), 0
+    start = time.perf_counter()
+    cap.start()
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        infer(INFER)
+        frames += 1
+    cap.release()
+    return frames / (time.perf_counter() - start)
+
+
+class Camera(object):
+    """cv2.VideoCapture stand-in for a live camera: frame i is due at
+    start + i / fps; `read` returns the oldest unread frame, waiting for it
+    if it is not due yet. Every frame carries its due time."""
+
+    def __init__(self, fps=30, seconds=LIVE_SECONDS):
+        self.fps = fps
+        self.frames = int(fps * seconds)
+        self.start = time.monotonic()
+        self.index = 0
+        self.image = np.zeros(SHAPE, dtype=np.uint8)
+
+    def isOpened(self):
+        return self.index < self.frames
+
+    def read(self):
+        due = self.start + self.index / self.fps
+        time.sleep(max(due - time.monotonic(), 0))
+        self.index += 1
+        return True, (due, self.image)
+
+    def release(self):
+        pass
+
+
+class CameraSource(FrameSource):
+    def _open(self):
+        return Camera()
+
+
+def live_lag(cap):
+    """Mean and max age of the frames when inference finishes, and how many
+    frames were processed"""
+    ages = list()
+    while cap.isOpened():
+        ret, item = cap.read()
+        if not ret:
+            break
+        due, frame = item
+        infer(LIVE_INFER)
+        ages.append(time.monotonic() - due)
+    return np.mean(ages), np.max(ages), len(ages)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "walk.avi")
+        write_video(path)
+        print(f"720p file, {INFER * 1000:.0f} ms inference")
+        print(f"  inline capture    {file_inline(path):6.1f} fps")
+        print(f"  FrameSource       {file_threaded(path):6.1f} fps")
+
+    print(f"30 fps live camera, {LIVE_INFER * 1000:.0f} ms inference, {LIVE_SECONDS} s")
+    print("                    lag mean   lag max   frames processed")
+    runs = (("inline capture", Camera),
+            ("FrameSource latest", lambda: CameraSource("rtsp://camera", mode="latest",
+                                                        reconnect=False).start()))
+    for name, open_camera in runs:
+        cap = open_camera()
+        mean, worst, processed = live_lag(cap)
+        cap.release()
+        print(f"  {name:<18}{mean * 1000:>6.0f} ms {worst * 1000:>6.0f} ms {processed:>12}")
+
+
+if __name__ == "__main__":
+    main()
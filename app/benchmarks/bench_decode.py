@@ -0,0 +1,71 @@
+"""
+Per-frame YOLOv8 decode time at several confidence thresholds, comparing
+the previous full transpose/argmax decode with `postprocess.decode_predictions`
+over all classes and over a person-only subset.
+
+The legacy path hands (x1, y1, x2, y2) boxes to NMSBoxes as if they were
+(x, y, w, h); the inflated boxes suppress far more, so at low thresholds its
+NMS has less to do than the corrected decode.
+
+Run from the `app` directory:
+
+    python -m benchmarks.bench_decode
+"""
+import timeit
+
+import cv2
+import numpy as np
+
+from postprocess import decode_predictions
+
+
+def synthetic_output(rng, num_classes=80, anchors=8400, objects=30):
+    """A (1, 4 + num_classes, anchors) head with a few confident clusters."""
+    output = np.empty((1, num_classes + 4, anchors), dtype=np.float32)
+    output[0, 0:2] = rng.uniform(0, 640, size=(2, anchors))
+    output[0, 2:4] = rng.uniform(10, 200, size=(2, anchors))
+    output[0, 4:] = rng.beta(0.5, 30, size=(num_classes, anchors))
+    for _ in range(objects):
+        cls = 0 if rng.uniform() < 0.8 else rng.integers(num_classes)
+        idx = rng.choice(anchors, size=20, replace=False)
+        center, size = rng.uniform(0, 640, 2), rng.uniform(20, 200, 2)
+        output[0, 0:2, idx] = center + rng.normal(0, 2, size=(20, 2))
+        output[0, 2:4, idx] = size + rng.normal(0, 2, size=(20, 2))
+        output[0, cls + 4, idx] = rng.uniform(0.2, 0.95, size=20)
+    return output
+
+
+def legacy_decode(output_tensor, conf_threshold, iou_threshold, num_classes=80):
+    output = output_tensor.squeeze(0).transpose(1, 0)
+    bbox_data = output[:, 0:4]
+    cls_scores = output[:, 4:(num_classes + 4)]
+    cx, cy, w, h = bbox_data[:, 0], bbox_data[:, 1], bbox_data[:, 2], bbox_data[:, 3]
+    boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+    conf_scores = np.max(cls_scores, axis=1)
+    class_ids = np.argmax(cls_scores, axis=1)
+    keep = conf_scores > conf_threshold
+    boxes, conf_scores, class_ids = boxes[keep], conf_scores[keep], class_ids[keep]
+    nms_indices = cv2.dnn.NMSBoxes(bboxes=boxes.tolist(), scores=conf_scores.tolist(),
+                                   score_threshold=conf_threshold,
+                                   nms_threshold=iou_threshold, top_k=1000)
+    return boxes[nms_indices], conf_scores[nms_indices], class_ids[nms_indices]
+
+
+def timed(fn, number=50, repeat=5):
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1e3
+
+
+def main():
+    output = synthetic_output(np.random.default_rng(0))
+    iou_threshold = 0.5
+    print("conf   legacy_ms   all_classes_ms   person_only_ms")
+    for conf in (0.1, 0.25, 0.5, 0.7):
+        legacy = timed(lambda: legacy_decode(output, conf, iou_threshold))
+        full = timed(lambda: decode_predictions(output, conf, iou_threshold))
+        person = timed(lambda: decode_predictions(output, conf, iou_threshold,
+                                                  classes=[0]))
+        print(f"{conf:<6} {legacy:>9.3f}   {full:>14.3f}   {person:>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
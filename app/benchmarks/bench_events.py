@@ -0,0 +1,67 @@
+"""
+Messages and bytes sent to the broker for an hour of a busy site (four
+cameras, two lines each, 5 crossings/s overall), one record per crossing
+in JSON as before or packed with `events.encode_binary`, against windowed
+counts from `WindowAggregator`. Window totals are decoded back and checked
+against the crossings.
+
+Run from the `app` directory:
+
+    python -m benchmarks.bench_events
+"""
+import json
+
+import numpy as np
+
+from events import WindowAggregator, decode_binary, encode_binary
+
+HOUR = 3600.0
+RATE = 5.0
+STREAMS = [f"gate-{i}" for i in range(4)]
+SPOOL = "0123456789abcdef0123456789abcdef"
+
+
+class Collect(list):
+    put = list.append
+
+
+def crossings(rng):
+    times = np.cumsum(rng.exponential(1 / RATE, size=int(HOUR * RATE * 1.2)))
+    for seq, at in enumerate(times[times < HOUR], start=1):
+        yield at, {"spool": SPOOL, "seq": seq, "time_stamp": "2024-01-01T00:00:00",
+                   "time_ms": int(at * 1000), "stream": str(rng.choice(STREAMS)),
+                   "line": int(rng.integers(2)), "obj_class": 0,
+                   "direction": str(rng.choice(["entry", "exit"]))}
+
+
+def windowed(events, seconds):
+    now = [0.0]
+    windows = Collect()
+    aggregator = WindowAggregator(windows, [seconds], clock=lambda: now[0])
+    for at, event in events:
+        now[0] = at
+        aggregator.put(event)
+    aggregator.flush()
+    return windows
+
+
+def main():
+    events = list(crossings(np.random.default_rng(0)))
+    rows = [("raw json", [json.dumps(event).encode("utf-8") for _, event in events]),
+            ("raw binary", [encode_binary(event) for _, event in events])]
+    for seconds in (1, 10, 60):
+        windows = windowed(events, seconds)
+        encoded = [encode_binary(window) for window in windows]
+        total = sum(count for data in encoded for *_, count in decode_binary(data)["counts"])
+        assert total == len(events)
+        rows.append((f"{seconds}s windows", encoded))
+
+    print(f"{len(events)} crossings in an hour over {len(STREAMS)} streams")
+    print("records        messages       bytes   bytes/crossing")
+    for name, messages in rows:
+        size = sum(len(message) for message in messages)
+        print(f"{name:<12} {len(messages):>10} {size:>11} {size / len(events):>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Memory held for track history on a long-running stream: the old dict of
+per-object center lists, which is never pruned, against `TrajectoryStore`
+with the tracker's removed tracks evicted. Objects come and go so that
+about 20 are in view at any time, each staying 150 frames.
+
+Run from the `app` directory:
+
+    python -m benchmarks.bench_history
+"""
+import tracemalloc
+
+import numpy as np
+
+from trajectory import TrajectoryStore
+
+IN_VIEW = 20
+LIFETIME = 150
+CHECKPOINTS = (10000, 50000, 100000)
+
+
+def frames(rng):
+    """Per-frame ids in view and their centers, and the ids gone since the
+    previous frame"""
+    alive = {i: rng.uniform(0, 1000, 2) for i in range(IN_VIEW)}
+    next_id = IN_VIEW
+    for frame in range(1, CHECKPOINTS[-1] + 1):
+        removed = []
+        if frame % (LIFETIME // IN_VIEW) == 0:
+            removed.append(min(alive))
+            del alive[removed[0]]
+            alive[next_id] = rng.uniform(0, 1000, 2)
+            next_id += 1
+        ids = list(alive)
+        centers = np.array([alive[i] for i in ids]) + rng.normal(0, 3, (len(ids), 2))
+        yield frame, ids, centers, removed
+
+
+def unbounded(rng):
+    history, sizes = dict(), []
+    tracemalloc.start()
+    for frame, ids, centers, _ in frames(rng):
+        for object_id, center in zip(ids, centers.tolist()):
+            history.setdefault(object_id, []).append(tuple(center))
+        if frame in CHECKPOINTS:
+            sizes.append(tracemalloc.get_traced_memory()[0])
+    tracemalloc.stop()
+    return sizes, len(history)
+
+
+def ring_buffer(rng):
+    sizes = []
+    tracemalloc.start()
+    store = TrajectoryStore(capacity=1024, length=32)
+    for frame, ids, centers, removed in frames(rng):
+        store.append(ids, centers)
+        store.evict(removed)
+        if frame in CHECKPOINTS:
+            sizes.append(tracemalloc.get_traced_memory()[0])
+    tracemalloc.stop()
+    return sizes, len(store)
+
+
+def main():
+    header = "".join(f"{f'{frames} frames':>16}" for frames in CHECKPOINTS)
+    print(f"{'history':<16}{header}{'tracks kept':>14}")
+    for name, run in (("dict of lists", unbounded), ("TrajectoryStore", ring_buffer)):
+        sizes, tracks = run(np.random.default_rng(0))
+        row = "".join(f"{size / 2 ** 20:>13.2f} MB" for size in sizes)
+        print(f"{name:<16}{row}{tracks:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+What reading frames at the detector input size saves after decode: bytes
+per frame handed from capture to inference, the time to copy one frame
+into a process-pool ring slot, and `Detector.preprocess` on a full-size
+frame against one already at `Detector.decode_size` (no resize needed),
+for 720p and 1080p sources and a letterboxed 640x640 model input.
+
+The reduced frames here are resized with OpenCV once up front; in the
+pipeline GStreamer (videoscale / nvvidconv) or the capture thread does it.
+Run from the `app` directory:
+
+    python -m benchmarks.bench_input_size
+"""
+import timeit
+
+import cv2
+import numpy as np
+
+from detector import Detector
+
+SOURCES = ((720, 1280), (1080, 1920))
+
+
+def timed(fn, number=50, repeat=5):
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1e3
+
+
+def main():
+    detector = Detector(letterbox=True)
+    rng = np.random.default_rng(0)
+    print("source   frame       MB/frame   ring copy (ms)   preprocess (ms)")
+    for source_shape in SOURCES:
+        full = rng.integers(0, 255, source_shape + (3,), dtype=np.uint8)
+        width, height = detector.decode_size(source_shape)
+        reduced = cv2.resize(full, (width, height))
+        slot = np.empty(full.nbytes, dtype=np.uint8)
+        rows = ((f"{source_shape[1]}x{source_shape[0]}", full, lambda: detector.preprocess(full)),
+                (f"{width}x{height}", reduced,
+                 lambda: detector.preprocess_batch([reduced], [source_shape])))
+        for name, frame, preprocess in rows:
+            copy = timed(lambda: np.copyto(slot[:frame.nbytes].reshape(frame.shape), frame))
+            print(f"{f'{source_shape[0]}p':<8} {name:<11} {frame.nbytes / 1e6:>8.2f} "
+                  f"{copy:>16.3f} {timed(preprocess):>17.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Micro-benchmark of the NumPy IoU kernel in `tracker.matching` against
+cython_bbox (when installed).
+
+Run from the `app` directory:
+
+    python -m benchmarks.bench_iou
+"""
+import timeit
+
+import numpy as np
+
+from tracker.matching import ious
+
+try:
+    from cython_bbox import bbox_overlaps
+except ImportError:
+    bbox_overlaps = None
+
+
+def random_boxes(n, rng, width=1280, height=720):
+    tl = rng.uniform(0, [width, height], size=(n, 2))
+    wh = rng.uniform(20, 200, size=(n, 2))
+    return np.ascontiguousarray(np.c_[tl, tl + wh], dtype=np.float64)
+
+
+def bench(n, repeat=20):
+    rng = np.random.default_rng(n)
+    a, b = random_boxes(n, rng), random_boxes(n, rng)
+    number = max(1, 10000 // (n * n // 10 + 1))
+
+    row = {"boxes": n,
+           "numpy_ms": min(timeit.repeat(lambda: ious(a, b), number=number,
+                                         repeat=repeat)) / number * 1e3}
+    if bbox_overlaps is not None:
+        assert np.allclose(ious(a, b), bbox_overlaps(a, b))
+        row["cython_ms"] = min(timeit.repeat(lambda: bbox_overlaps(a, b),
+                                             number=number,
+                                             repeat=repeat)) / number * 1e3
+    return row
+
+
+def main():
+    if bbox_overlaps is None:
+        print("cython_bbox not installed, timing the NumPy kernel only")
+    for n in (10, 100, 1000):
+        row = bench(n)
+        line = f"{row['boxes']:>5} x {row['boxes']:<5} numpy {row['numpy_ms']:8.3f} ms"
+        if "cython_ms" in row:
+            line += f"   cython {row['cython_ms']:8.3f} ms"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+NumPy NMS (`nms.nms` / `nms.batched_nms`) against cv2.dnn.NMSBoxes at
+100-5000 candidate boxes.
+
+Run from the `app` directory:
+
+    python -m benchmarks.bench_nms
+"""
+import timeit
+
+import cv2
+import numpy as np
+
+from nms import nms, batched_nms
+
+
+def clustered_candidates(n, rng, objects=40):
+    """Candidates jittered around a few objects, as a detector head emits them."""
+    centers = rng.uniform(0, 640, size=(objects, 2))
+    sizes = rng.uniform(20, 200, size=(objects, 2))
+    owner = rng.integers(objects, size=n)
+    wh = sizes[owner] * rng.uniform(0.8, 1.2, size=(n, 2))
+    tl = centers[owner] + rng.normal(0, 6, size=(n, 2)) - wh / 2
+    scores = rng.uniform(0.3, 1.0, size=n).astype(np.float32)
+    class_ids = rng.integers(3, size=n)
+    return np.c_[tl, tl + wh], np.c_[tl, wh], scores, class_ids
+
+
+def timed(fn, number=20, repeat=5):
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1e3
+
+
+def main(iou_threshold=0.5):
+    rng = np.random.default_rng(0)
+    print("boxes   opencv_ms   opencv_lists_ms   numpy_ms   "
+          "opencv_per_class_ms   numpy_per_class_ms")
+    for n in (100, 500, 1000, 2000, 5000):
+        tlbr, xywh, scores, class_ids = clustered_candidates(n, rng)
+        reference = np.asarray(cv2.dnn.NMSBoxes(xywh, scores, 0.0, iou_threshold),
+                               dtype=np.intp).reshape(-1)
+        assert np.array_equal(reference, nms(tlbr, scores, iou_threshold))
+
+        opencv = timed(lambda: cv2.dnn.NMSBoxes(xywh, scores, 0.0, iou_threshold))
+        # What decode_output used to do: convert to lists on every frame.
+        opencv_lists = timed(lambda: cv2.dnn.NMSBoxes(xywh.tolist(), scores.tolist(),
+                                                      0.0, iou_threshold))
+        numpy_ = timed(lambda: nms(tlbr, scores, iou_threshold))
+        opencv_per_class = timed(lambda: cv2.dnn.NMSBoxesBatched(
+            xywh, scores, class_ids.astype(np.int32), 0.0, iou_threshold))
+        numpy_per_class = timed(lambda: batched_nms(tlbr, scores, class_ids,
+                                                    iou_threshold))
+        print(f"{n:<7} {opencv:>9.3f}   {opencv_lists:>15.3f}   {numpy_:>8.3f}   "
+              f"{opencv_per_class:>19.3f}   {numpy_per_class:>18.3f}")
+
+
+if __name__ == "__main__":
+    main()
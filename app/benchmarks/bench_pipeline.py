@@ -0,0 +1,67 @@
+"""
+End-to-end time per frame of a serial capture -> detect -> track -> draw
+loop against `pipeline.Pipeline`, with stage costs simulated by sleeps
+(which release the GIL like cv2, CUDA and ONNX Runtime calls do), and the
+drops each backpressure policy makes when capture outpaces detection.
+
+Run from the `app` directory:
+
+    python -m benchmarks.bench_pipeline
+"""
+import time
+
+from pipeline import Pipeline, Stage
+
+STAGE_COSTS = {"capture": 0.004, "detect": 0.010, "track": 0.003, "draw": 0.002}
+
+
+def work(seconds):
+    def fn(item):
+        time.sleep(seconds)
+        return item
+    return fn
+
+
+def frames(count, interval):
+    for i in range(count):
+        time.sleep(interval)
+        yield i
+
+
+def serial(count):
+    start = time.perf_counter()
+    for item in frames(count, STAGE_COSTS["capture"]):
+        for name in ("detect", "track", "draw"):
+            work(STAGE_COSTS[name])(item)
+    return (time.perf_counter() - start) / count
+
+
+def pipelined(count, policy="block", detect_workers=1, capture=STAGE_COSTS["capture"]):
+    pipeline = Pipeline(frames(count, capture), [
+        Stage("detect", work(STAGE_COSTS["detect"]), workers=detect_workers, policy=policy),
+        Stage("track", work(STAGE_COSTS["track"])),
+        Stage("draw", work(STAGE_COSTS["draw"])),
+    ])
+    start = time.perf_counter()
+    pipeline.run()
+    return (time.perf_counter() - start) / count, pipeline.stats()
+
+
+def main(count=200):
+    print(f"stage costs (ms): { {k: v * 1e3 for k, v in STAGE_COSTS.items()} }")
+    print(f"{'serial':<30} {serial(count) * 1e3:6.2f} ms/frame")
+    for workers in (1, 2):
+        per_frame, _ = pipelined(count, detect_workers=workers)
+        label = f"pipelined, {workers} detect worker(s)"
+        print(f"{label:<30} {per_frame * 1e3:6.2f} ms/frame")
+
+    print("\ncapture at 2 ms/frame, 1 detect worker")
+    for policy in ("block", "drop_oldest", "drop_newest"):
+        per_frame, stats = pipelined(count, policy=policy, capture=0.002)
+        print(f"{policy:<12} {per_frame * 1e3:6.2f} ms/frame   "
+              f"detected {stats['detect']['processed']:>3}   "
+              f"dropped {stats['detect']['dropped']:>3}")
+
+
+if __name__ == "__main__":
+    main()
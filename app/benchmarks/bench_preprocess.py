@@ -0,0 +1,73 @@
+"""
+Host memory churn and latency of the per-frame preprocessing path: the
+previous resize / divide / astype / transpose / copy chain with a fresh
+output array per call, against `Detector.preprocess` writing into the
+preallocated per-thread input and output buffers, stretched, letterboxed or
+letterboxed from a region of interest around the counting line.
+
+Allocation is the tracemalloc peak above the steady state during one frame,
+extrapolated to 30 fps over several cameras. Run from the `app` directory:
+
+    python -m benchmarks.bench_preprocess
+"""
+import timeit
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from detector import Detector
+from utils import roi_from_line
+
+
+def legacy_preprocess(frame, input_shape=(1, 3, 640, 640), output_shape=(1, 84, 8400)):
+    resized = cv2.resize(frame, (input_shape[3], input_shape[2]))
+    normalized = (resized / 255.0).astype(np.float32)
+    chw = normalized.transpose(2, 0, 1)
+    input_tensor = np.ascontiguousarray(chw)[None]
+    host_output = np.empty(output_shape, dtype=np.float32)
+    return input_tensor, host_output
+
+
+def buffered_preprocess(detector, frame):
+    return detector.preprocess(frame), detector._output_buffer()
+
+
+def peak_bytes(fn, warmup=3):
+    for _ in range(warmup):
+        fn()
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        fn()
+        return tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+
+
+def timed(fn, number=50, repeat=5):
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1e3
+
+
+def main():
+    detector = Detector()
+    letterboxed = Detector(letterbox=True)
+    cropped = Detector(letterbox=True, roi=roi_from_line([(750, 200), (950, 1250)], 150))
+    frame = np.random.default_rng(0).integers(0, 255, size=(720, 1280, 3), dtype=np.uint8)
+    assert np.array_equal(legacy_preprocess(frame)[0], detector.preprocess(frame))
+
+    print("path        latency (ms)   peak alloc/frame (MB)   "
+          "churn @30fps x 1 / 8 / 32 cams (MB/s)")
+    for name, fn in (("legacy", lambda: legacy_preprocess(frame)),
+                     ("buffered", lambda: buffered_preprocess(detector, frame)),
+                     ("letterbox", lambda: buffered_preprocess(letterboxed, frame)),
+                     ("roi", lambda: buffered_preprocess(cropped, frame))):
+        latency = timed(fn)
+        peak = peak_bytes(fn) / 1e6
+        churn = " / ".join(f"{peak * 30 * cams:.0f}" for cams in (1, 8, 32))
+        print(f"{name:<11} {latency:>12.3f}   {peak:>21.2f}   {churn:>36}")
+
+
+if __name__ == "__main__":
+    main()
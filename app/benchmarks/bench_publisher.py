@@ -0,0 +1,149 @@
+"""
+Event publishing throughput against an in-process fake broker whose
+produce requests take `RTT` seconds each. The previous sender waited for
+every event's outcome (5 s each, a 0.2 events/s ceiling); the closest fair
+comparison is a blocking sender waiting for each ack, against
+`EventPublisher` letting the producer batch records while waiting for acks.
+
+Run from the `app` directory:
+
+    python -m benchmarks.bench_publisher
+"""
+import threading
+import time
+
+from msghandler import EventPublisher
+
+RTT = 0.005
+EVENTS = 2000
+
+
+class FakeFuture(object):
+    def __init__(self):
+        self._callbacks = list()
+        self._errbacks = list()
+        self._lock = threading.Lock()
+        self.done = threading.Event()
+
+    def add_callback(self, fn, *args):
+        with self._lock:
+            self._callbacks.append(lambda value: fn(*args, value))
+        return self
+
+    def add_errback(self, fn, *args):
+        with self._lock:
+            self._errbacks.append(lambda ex: fn(*args, ex))
+        return self
+
+    def resolve(self, value=None, error=None):
+        with self._lock:
+            callbacks = self._errbacks if error is not None else self._callbacks
+        for callback in callbacks:
+            callback(error if error is not None else value)
+        self.done.set()
+
+    def get(self):
+        self.done.wait()
+
+
+class FakeProducer(object):
+    """KafkaProducer stand-in: records accumulate for `linger` seconds (or
+    `batch_records` records) and each batch is acked `rtt` seconds later,
+    or failed while `down` is set"""
+
+    def __init__(self, rtt=RTT, linger=0.02, batch_records=500):
+        self.rtt = rtt
+        self.linger = linger
+        self.batch_records = batch_records
+        self.records = list()
+        self.pending = list()
+        self.in_flight = 0
+        self.down = threading.Event()
+        self._ready = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._io, daemon=True)
+        self._thread.start()
+
+    def send(self, topic, value=None):
+        future = FakeFuture()
+        with self._ready:
+            self.pending.append((value, future))
+            self._ready.notify()
+        return future
+
+    def _io(self):
+        while True:
+            with self._ready:
+                while not self.pending and not self._closed:
+                    self._ready.wait()
+                if not self.pending:
+                    return
+                deadline = time.monotonic() + self.linger
+                while len(self.pending) < self.batch_records and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._ready.wait(remaining)
+                batch = self.pending[:self.batch_records]
+                del self.pending[:self.batch_records]
+                self.in_flight = len(batch)
+            time.sleep(self.rtt)
+            for value, future in batch:
+                if self.down.is_set():
+                    future.resolve(error=ConnectionError("broker unreachable"))
+                    continue
+                self.records.append(value)
+                future.resolve()
+            with self._ready:
+                self.in_flight = 0
+
+    def flush(self, timeout=None):
+        while True:
+            with self._ready:
+                if not self.pending and not self.in_flight:
+                    break
+            time.sleep(self.rtt)
+
+    def close(self):
+        with self._ready:
+            self._closed = True
+            self._ready.notify()
+        self._thread.join()
+
+
+def blocking(events):
+    producer = FakeProducer(linger=0)
+    start = time.perf_counter()
+    for index in range(events):
+        producer.send("events", value={"direction": "entry", "index": index}).get()
+    elapsed = time.perf_counter() - start
+    producer.close()
+    return events / elapsed, elapsed / events, len(producer.records)
+
+
+def published(events):
+    producer = FakeProducer()
+    publisher = EventPublisher(producer, "events")
+    publisher.start()
+    start = time.perf_counter()
+    for index in range(events):
+        publisher.put({"direction": "entry", "index": index})
+    put_time = time.perf_counter() - start
+    publisher.close()
+    stats = publisher.stats()
+    return stats, put_time / events, len(producer.records)
+
+
+def main():
+    print(f"{EVENTS} events, broker round trip {RTT * 1e3:.0f} ms")
+    throughput, latency, delivered = blocking(EVENTS)
+    print(f"blocking sender   {throughput:>8.0f} events/s   {latency * 1e3:.2f} ms blocked per event"
+          f"   {delivered} delivered")
+    stats, put_time, delivered = published(EVENTS)
+    print(f"EventPublisher    {stats['throughput']:>8.0f} events/s   {put_time * 1e3:.3f} ms blocked per event"
+          f"   {delivered} delivered, ack latency mean {stats['latency_mean'] * 1e3:.1f}"
+          f" / max {stats['latency_max'] * 1e3:.1f} ms, {stats['failed']} failed")
+
+
+if __name__ == "__main__":
+    main()
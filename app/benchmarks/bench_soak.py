@@ -0,0 +1,68 @@
+"""
+Long-running BYTETracker soak test: people keep walking through the frame
+(about 25 in view, each for some 150 frames) and the per-frame update
+latency and the tracker's bookkeeping are reported per window of frames.
+Both should stay flat however long it runs; a removed-track list that is
+never trimmed shows up as latency and `removed` growing with the frame
+count.
+
+Run from the `app` directory (defaults to a million frames):
+
+    python -m benchmarks.bench_soak [frames]
+"""
+import sys
+import time
+from argparse import Namespace
+
+import numpy as np
+
+from tracker.basetrack import BaseTrack
+from tracker.byte_tracker import BYTETracker
+
+FRAME_SHAPE = (720, 1280)
+WINDOWS = 10
+
+
+def scene(rng, frames, spawn_rate=0.17):
+    """Per-frame (N, 5) x1, y1, x2, y2, score detections of people walking
+    across the frame in either direction"""
+    people = np.empty((0, 4))  # x, y, vx, vy
+    for _ in range(frames):
+        spawned = rng.poisson(spawn_rate)
+        if spawned:
+            left = rng.uniform(size=spawned) < 0.5
+            x = np.where(left, 0.0, FRAME_SHAPE[1])
+            vx = rng.uniform(6, 12, spawned) * np.where(left, 1, -1)
+            people = np.vstack([people, np.column_stack(
+                [x, rng.uniform(100, 600, spawned), vx, rng.uniform(-0.5, 0.5, spawned)])])
+        people[:, :2] += people[:, 2:]
+        people = people[(people[:, 0] >= 0) & (people[:, 0] <= FRAME_SHAPE[1])]
+        seen = people[rng.uniform(size=len(people)) > 0.05]  # missed detections
+        centers = seen[:, :2] + rng.normal(0, 2, (len(seen), 2))
+        yield np.column_stack([centers - (30, 75), centers + (30, 75),
+                               rng.uniform(0.7, 0.95, len(seen))])
+
+
+def main():
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    window = max(frames // WINDOWS, 1)
+    tracker = BYTETracker(Namespace(track_thresh=0.6, match_thresh=0.9, track_buffer=30,
+                                    mot20=False))
+    print(f"{'frames':>10} {'mean ms':>8} {'p99 ms':>8} {'tracked':>8} {'lost':>6} "
+          f"{'removed':>8} {'slots':>6} {'ids':>9}")
+    latencies = np.empty(window)
+    for frame, dets in enumerate(scene(np.random.default_rng(0), frames), 1):
+        start = time.perf_counter()
+        tracker.update(dets, FRAME_SHAPE, FRAME_SHAPE)
+        tracker.pop_removed_ids()
+        latencies[(frame - 1) % window] = time.perf_counter() - start
+        if frame % window == 0:
+            print(f"{frame:>10} {latencies.mean() * 1e3:>8.3f} "
+                  f"{np.percentile(latencies, 99) * 1e3:>8.3f} "
+                  f"{len(tracker.tracked_stracks):>8} {len(tracker.lost_stracks):>6} "
+                  f"{len(tracker.removed_stracks):>8} {tracker.track_store.capacity:>6} "
+                  f"{BaseTrack._count:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Event delivery through the on-disk spool across a broker outage and a
+restart, against the in-process fake broker of bench_publisher: events keep
+arriving while the broker is down, the publisher is then shut down with
+undelivered events and a new one resumes from the spool. Reports the cost
+of spooling an event, whether every event was delivered and how many
+duplicates consumers have to drop; then how a disk limit bounds the spool
+during a long outage.
+
+Run from the `app` directory:
+
+    python -m benchmarks.bench_spool
+"""
+import logging
+import os
+import tempfile
+import time
+
+from benchmarks.bench_publisher import FakeProducer
+from msghandler import EventPublisher
+from spool import EventSpool
+
+EVENTS = 3000
+
+
+def publisher(directory, producer, **spool_options):
+    publisher = EventPublisher(producer, "events", spool=EventSpool(directory, **spool_options),
+                               retry_backoff=0.1, sync_interval=0.05)
+    publisher.start()
+    return publisher
+
+
+def outage_and_restart(directory):
+    first = publisher(directory, FakeProducer())
+    for index in range(EVENTS):
+        if index == EVENTS // 3:
+            first.producer.down.set()  # broker goes away...
+        first.put({"direction": "entry", "index": index})
+        time.sleep(0.0005)
+    first.close()  # ...and the device restarts before it is back
+    backlog = first.spool.stats()["backlog"]
+
+    second = publisher(directory, FakeProducer())
+    while second.spool.backlog():
+        time.sleep(0.01)
+    second.close()
+    delivered = first.producer.records + second.producer.records
+    unique = {(record["spool"], record["seq"]) for record in delivered}
+    return backlog, len(unique), len(delivered) - len(unique)
+
+
+def spool_cost(directory):
+    spool = EventSpool(directory)
+    start = time.perf_counter()
+    for index in range(EVENTS):
+        spool.append({"direction": "entry", "index": index})
+    append = (time.perf_counter() - start) / EVENTS
+    start = time.perf_counter()
+    spool.sync()
+    sync = time.perf_counter() - start
+    spool.close()
+    return append, sync
+
+
+def disk_limit(directory, max_bytes=64 * 1024):
+    spooled = publisher(directory, FakeProducer(), segment_bytes=8 * 1024, max_bytes=max_bytes)
+    spooled.producer.down.set()
+    for index in range(EVENTS):
+        spooled.put({"direction": "entry", "index": index})
+    time.sleep(0.2)
+    spooled.close()
+    stats = spooled.spool.stats()
+    on_disk = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+    return stats["evicted"], on_disk
+
+
+def main():
+    logging.disable(logging.ERROR)  # one failure line per event in the outage
+    with tempfile.TemporaryDirectory() as directory:
+        append, sync = spool_cost(directory)
+    print(f"spool append         {append * 1e6:>8.1f} us/event, sync (fsync) {sync * 1e3:.2f} ms")
+    with tempfile.TemporaryDirectory() as directory:
+        backlog, unique, duplicates = outage_and_restart(directory)
+    print(f"{EVENTS} events, broker down from event {EVENTS // 3} until a restart")
+    print(f"backlog at restart   {backlog:>8}")
+    print(f"delivered            {unique:>8} of {EVENTS}, {duplicates} duplicates to drop")
+    with tempfile.TemporaryDirectory() as directory:
+        evicted, on_disk = disk_limit(directory)
+    print(f"64 KB disk limit     {evicted:>8} oldest events evicted, {on_disk / 1024:.0f} KB on disk")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Detector calls and line crossings counted with detection on every frame
+against `stride.AdaptiveStride`, on a simulated quiet camera: people
+appear now and then at either side of a vertical counting line and walk
+across it at 2-8 px/frame, with box jitter and occasional missed detections.
+
+Run from the `app` directory:
+
+    python -m benchmarks.bench_stride
+"""
+from argparse import Namespace
+
+import numpy as np
+
+from counting import CrossingCounter
+from stride import AdaptiveStride
+from tracker.byte_tracker import BYTETracker
+
+LINE = ((640, 0), (640, 720))
+FRAME_SHAPE = (720, 1280)
+
+
+def simulate(rng, frames=9000, spawn_rate=0.01):
+    """Per-frame (N, 5) x1, y1, x2, y2, score detections and the true number
+    of crossings."""
+    people, detections, crossings = [], [], 0
+    for _ in range(frames):
+        if rng.uniform() < spawn_rate:
+            left = rng.uniform() < 0.5
+            x = rng.uniform(50, 300) if left else rng.uniform(980, 1230)
+            speed = rng.uniform(2, 8) * (1 if left else -1)
+            people.append([x, rng.uniform(100, 500), speed, rng.uniform(-0.5, 0.5)])
+            crossings += 1
+        boxes = []
+        for person in people:
+            person[0] += person[2]
+            person[1] += person[3]
+            if rng.uniform() < 0.05:
+                continue  # missed detection
+            cx, cy = person[0] + rng.normal(0, 2), person[1] + rng.normal(0, 2)
+            boxes.append([cx - 30, cy - 75, cx + 30, cy + 75, rng.uniform(0.7, 0.95)])
+        people = [p for p in people if 0 < p[0] < FRAME_SHAPE[1]]
+        detections.append(np.array(boxes, dtype=np.float64).reshape(-1, 5))
+    return detections, crossings
+
+
+def tracked_objects(tracks):
+    return [{"object_id": track.track_id, "bbox": track.tlbr.tolist()} for track in tracks]
+
+
+def count(detections, stride=None):
+    args = Namespace(track_thresh=0.6, match_thresh=0.9, track_buffer=60, mot20=False)
+    tracker = BYTETracker(args)
+    counter, counted, calls = CrossingCounter([LINE]), 0, 0
+    for dets in detections:
+        detected = None
+        if stride is None or stride.due():
+            calls += 1
+            detected = len(dets)
+            tracks = tracker.update(dets.copy(), FRAME_SHAPE, FRAME_SHAPE)
+        else:
+            tracks = tracker.advance()
+        objects = tracked_objects(tracks)
+        if stride is not None:
+            stride.observe(objects, detected)
+        counted += len(counter.update_objects(objects))
+        counter.forget(tracker.pop_removed_ids())
+    return calls, counted
+
+
+def main():
+    detections, truth = simulate(np.random.default_rng(0))
+    print(f"{len(detections)} frames, {truth} true crossings")
+    print("mode              detector calls   crossings counted")
+    calls, counted = count(detections)
+    print(f"{'every frame':<17} {calls:>14}   {counted:>17}")
+    for max_stride in (3, 5, 8):
+        calls, counted = count(detections, AdaptiveStride(LINE, max_stride=max_stride))
+        print(f"{f'adaptive, k<={max_stride}':<17} {calls:>14}   {counted:>17}")
+
+
+if __name__ == "__main__":
+    main()
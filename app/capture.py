@@ -0,0 +1,251 @@
+import logging
+import re
+import threading
+import time
+from pathlib import Path
+from queue import Empty
+
+import cv2
+
+from pipeline import BoundedQueue, STOP
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+LIVE_SCHEMES = ("rtsp://", "rtsps://", "rtmp://", "http://", "https://", "udp://")
+
+
+def is_live(source):
+    """Cameras and network streams, as opposed to video files"""
+    source = str(source)
+    return source.isdigit() or source.startswith(LIVE_SCHEMES) or "!" in source
+
+
+def has_gstreamer():
+    """Whether this OpenCV build can open GStreamer pipelines"""
+    return re.search(r"GStreamer:\s+YES", cv2.getBuildInformation()) is not None
+
+
+def gstreamer_pipeline(source, size=None, hardware=False, latest=True, latency_ms=200):
+    """
+    GStreamer pipeline string for cv2.CAP_GSTREAMER that decodes `source`
+    (an rtsp:// url, a file path or a camera index, read through v4l2src
+    from /dev/video<index>), optionally scales it to `size`
+    (width, height) and converts it to BGR inside the pipeline. With
+    `hardware` the Jetson nvvidconv element does the scaling and most of the
+    conversion; decodebin picks the hardware decoder on its own where one
+    is installed. With `latest` the appsink keeps only the newest frame.
+    """
+    source = str(source)
+    if source.isdigit():
+        src = f"v4l2src device=/dev/video{source} ! decodebin"
+    elif source.startswith(("rtsp://", "rtsps://")):
+        src = f'rtspsrc location="{source}" latency={latency_ms} ! decodebin'
+    elif "://" in source:
+        src = f'uridecodebin uri="{source}"'
+    else:
+        src = f'uridecodebin uri="{Path(source).resolve().as_uri()}"'
+    scale = "" if size is None else f",width={size[0]},height={size[1]}"
+    if hardware:
+        convert = f"nvvidconv ! video/x-raw,format=BGRx{scale} ! videoconvert ! video/x-raw,format=BGR"
+    else:
+        convert = f"videoconvert ! videoscale ! video/x-raw,format=BGR{scale}"
+    sink = "appsink drop=true max-buffers=1 sync=false" if latest else "appsink sync=false"
+    return f"{src} ! {convert} ! {sink}"
+
+
+class FrameSource(object):
+    """
+    Threaded video capture.
+
+    A decode thread reads `source` and hands frames over through a queue,
+    so a slow grab never holds up inference. In "latest" mode only the
+    newest frame is kept and older unread ones are dropped (counted in
+    `stats`), which keeps live streams in real time; in "lossless" mode the
+    decode thread waits for the reader instead, for files. "auto" picks
+    "latest" for live sources (see `is_live`).
+
+    With `size` (width, height), or a function of the source's (height,
+    width) returning it such as Detector.decode_size, frames are handed
+    over at that size rather than the source's, and `source_shape` tells
+    what they were reduced from. With `gstreamer` the source is opened
+    through a pipeline built by `gstreamer_pipeline`, so decoding, scaling
+    and BGR conversion all happen in GStreamer (the source's own size is
+    probed once per connection); without it frames are resized on the
+    decode thread. With `keep_full` frames are decoded at full size and the
+    full-size frame is kept next to the reduced one, e.g. for annotation.
+    A source that already is a pipeline ("... ! appsink") is used as is.
+
+    Live sources that fail to open or stop delivering frames are reopened
+    with exponential backoff up to `max_backoff` seconds; files end at
+    their last frame.
+
+    `read`, `isOpened` and `release` mirror cv2.VideoCapture. `frames`
+    runs the same decode loop on the caller's own thread instead.
+    """
+
+    MODES = ("auto", "latest", "lossless")
+
+    def __init__(self, source, mode="auto", gstreamer=False, size=None, keep_full=False,
+                 hardware=False, latency_ms=200, queue_size=4, reconnect=None,
+                 retry_backoff=1.0, max_backoff=30.0):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown capture mode: {mode}")
+        self.source = source
+        live = is_live(source)
+        self.latest = live if mode == "auto" else mode == "latest"
+        self.gstreamer = gstreamer or "!" in str(source)
+        self.size = size
+        self.keep_full = keep_full
+        self.hardware = hardware
+        self.latency_ms = latency_ms
+        self.reconnect = live if reconnect is None else reconnect
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        if self.latest:
+            self.queue = BoundedQueue(1, "drop_oldest")
+        else:
+            self.queue = BoundedQueue(queue_size, "block")
+        self.source_shape = None  # (height, width) the frames are reduced from, with size
+        self.captured = None  # monotonic grab time of the last frame read
+        self.full = None  # full-size copy of the last frame read, with keep_full
+        self.grabbed = 0
+        self.reconnects = 0
+        self.grab_total = 0.0
+        self.grab_max = 0.0
+        self._stop = threading.Event()
+        self._ended = False
+        self._thread = None
+
+    def _scaled_in_pipeline(self):
+        return (self.gstreamer and self.size is not None and not self.keep_full
+                and "!" not in str(self.source))
+
+    def _size(self, source_shape):
+        return self.size(source_shape) if callable(self.size) else self.size
+
+    def _open(self):
+        if not self.gstreamer:
+            source = int(self.source) if str(self.source).isdigit() else self.source
+            return cv2.VideoCapture(source)
+        if not has_gstreamer():
+            logger.error("This OpenCV build has no GStreamer support")
+        if "!" in str(self.source):
+            return cv2.VideoCapture(self.source, cv2.CAP_GSTREAMER)
+        size = None
+        if self._scaled_in_pipeline():
+            # The source's own size, for mapping detections back to it
+            probe = cv2.VideoCapture(gstreamer_pipeline(self.source, latency_ms=self.latency_ms),
+                                     cv2.CAP_GSTREAMER)
+            self.source_shape = (int(probe.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                                 int(probe.get(cv2.CAP_PROP_FRAME_WIDTH)))
+            probe.release()
+            if not all(self.source_shape):
+                return probe  # Closed: retried like any failed open
+            size = self._size(self.source_shape)
+        pipeline = gstreamer_pipeline(self.source, size, self.hardware, self.latest,
+                                      self.latency_ms)
+        return cv2.VideoCapture(pipeline, cv2.CAP_GSTREAMER)
+
+    def _reduce(self, frame):
+        """The frame to hand over and, with keep_full, the full-size one"""
+        if self.size is None or self._scaled_in_pipeline():
+            return frame, None
+        self.source_shape = frame.shape[:2]
+        size = tuple(self._size(self.source_shape))
+        if size == (frame.shape[1], frame.shape[0]):
+            return frame, None
+        return cv2.resize(frame, size), frame if self.keep_full else None
+
+    def _sleep(self, seconds, running):
+        """Wait `seconds`, waking up early on release() or once `running()` is false"""
+        deadline = time.monotonic() + seconds
+        while not self._stop.is_set() and running():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return True
+            self._stop.wait(min(remaining, 0.5))
+        return False
+
+    def frames(self, running=lambda: True):
+        """Yield (grab time, frame, full-size frame or None) until the stream
+        ends, release() is called or `running()` turns false, reopening live
+        sources that fail"""
+        backoff = self.retry_backoff
+        while not self._stop.is_set() and running():
+            cap = self._open()
+            try:
+                while cap.isOpened() and not self._stop.is_set() and running():
+                    start = time.monotonic()
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    captured = time.monotonic()
+                    self.grabbed += 1
+                    self.grab_total += captured - start
+                    self.grab_max = max(self.grab_max, captured - start)
+                    backoff = self.retry_backoff
+                    yield (captured,) + self._reduce(frame)
+            finally:
+                cap.release()
+            if not self.reconnect:
+                return
+            logger.error(f"{self.source}: stream lost, reconnecting in {backoff:.1f}s")
+            if not self._sleep(backoff, running):
+                return
+            backoff = min(backoff * 2, self.max_backoff)
+            self.reconnects += 1
+
+    def _decode(self):
+        for item in self.frames():
+            self.queue.put(item)
+        self.queue.put(STOP)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._decode, name=f"capture-{self.source}",
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def read(self):
+        """(True, frame) with the next frame, (False, None) once the stream ended"""
+        while not self._ended:
+            try:
+                item = self.queue.get(timeout=0.5)
+            except Empty:
+                if self._stop.is_set():
+                    self._ended = True
+                continue
+            if item is STOP:
+                self._ended = True
+                break
+            self.captured, frame, self.full = item
+            return True, frame
+        return False, None
+
+    def isOpened(self):
+        return not self._ended
+
+    def release(self, timeout=5.0):
+        """Stop the decode thread, waiting at most `timeout` seconds for it
+        (a grab stuck on a dead network stream is left to the daemon thread)"""
+        self._stop.set()
+        if self._thread is not None:
+            # Unblock a lossless decode thread waiting for room
+            deadline = time.monotonic() + timeout
+            while self._thread.is_alive() and time.monotonic() < deadline:
+                try:
+                    self.queue.get(timeout=0.1)
+                except Empty:
+                    pass
+            if self._thread.is_alive():
+                logger.warning(f"{self.source}: capture thread did not stop within {timeout}s")
+        self._ended = True
+
+    def stats(self):
+        return {"mode": "latest" if self.latest else "lossless",
+                "grabbed": self.grabbed,
+                "dropped": self.queue.dropped,
+                "reconnects": self.reconnects,
+                "grab_mean": self.grab_total / max(self.grabbed, 1),
+                "grab_max": self.grab_max}
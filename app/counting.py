@@ -0,0 +1,114 @@
+import numpy as np
+
+from trajectory import TrajectoryStore
+
+DIRECTIONS = np.array(["exit", "entry"])
+
+
+def _cross(o, a, b):
+    """z component of (a - o) x (b - o), broadcast over leading axes"""
+    return (a[..., 0] - o[..., 0]) * (b[..., 1] - o[..., 1]) \
+        - (a[..., 1] - o[..., 1]) * (b[..., 0] - o[..., 0])
+
+
+def segment_crossings(prev, curr, lines):
+    """
+    Which of the N moves `prev` -> `curr` ((N, 2) each) cross which of the
+    (L, 2, 2) line segments: a (N, L) bool matrix, and the (N, L) crossing
+    direction, True for an "entry" as utils.has_crossed_line defines it.
+    A center sitting exactly on a line counts as entered, so a move through
+    a line in two steps is counted once.
+    """
+    p, q = prev[:, None, :], curr[:, None, :]
+    a, b = lines[None, :, 0, :], lines[None, :, 1, :]
+    side_p = _cross(a, b, p) >= 0
+    side_q = _cross(a, b, q) >= 0
+    # The move straddles the segment: its endpoints lie on both sides of the move
+    straddle = _cross(p, q, a) * _cross(p, q, b) <= 0
+    return (side_p != side_q) & straddle, side_q
+
+
+def points_in_polygons(points, polygons):
+    """(N, Z) bool: whether each of the (N, 2) `points` lies inside each of
+    the (Z, V, 2) `polygons` (even-odd rule; pad short polygons by repeating
+    their last vertex)"""
+    x, y = points[:, None, None, 0], points[:, None, None, 1]
+    a = polygons[None]
+    b = np.roll(polygons, -1, axis=1)[None]
+    spans = (a[..., 1] > y) != (b[..., 1] > y)
+    dy = np.where(spans, b[..., 1] - a[..., 1], 1.0)
+    hits = spans & (x < a[..., 0] + (b[..., 0] - a[..., 0]) * (y - a[..., 1]) / dy)
+    return hits.sum(axis=2) % 2 == 1
+
+
+def pad_polygons(polygons):
+    """Stack polygons of different vertex counts into one (Z, V, 2) array"""
+    if not polygons:
+        return np.empty((0, 3, 2))
+    size = max(len(polygon) for polygon in polygons)
+    return np.array([list(polygon) + [polygon[-1]] * (size - len(polygon))
+                     for polygon in polygons], dtype=np.float64)
+
+
+class CrossingCounter(object):
+    """
+    Line crossing and zone occupancy for all tracked objects at once.
+
+    `update` takes the objects of a frame as arrays of ids and box centers.
+    Each center is compared with the object's previous one against every
+    line segment in a single NumPy pass, and the objects inside each zone
+    polygon are counted. Centers are kept in a bounded TrajectoryStore of
+    `capacity` tracks and `history` points each; a track briefly lost and
+    found again still has its last center, and `forget` drops the tracks
+    the tracker removed.
+    """
+
+    def __init__(self, lines, zones=None, capacity=1024, history=32):
+        self.lines = np.array(lines, dtype=np.float64).reshape(-1, 2, 2)
+        self.zone_names = list(zones or {})
+        self.zones = pad_polygons([zones[name] for name in self.zone_names])
+        self.trajectories = TrajectoryStore(capacity, history)
+        self.counts = np.zeros((len(self.lines), 2), dtype=np.int64)  # (exit, entry)
+        self.occupancy = np.zeros(len(self.zone_names), dtype=np.int64)
+
+    def update(self, ids, centers):
+        """Feed a frame's (N,) object ids and (N, 2) centers; returns the
+        crossings as (object_id, line_index, direction) tuples"""
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        centers = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+
+        prev, known = self.trajectories.last(ids)
+        crossings = list()
+        if len(prev):
+            crossed, entry = segment_crossings(prev, centers[known], self.lines)
+            objects, lines = np.nonzero(crossed)
+            if len(objects):
+                entry = entry[objects, lines].astype(np.int64)
+                np.add.at(self.counts, (lines, entry), 1)
+                crossings = list(zip(ids[known][objects].tolist(), lines.tolist(),
+                                     DIRECTIONS[entry].tolist()))
+
+        if len(self.zones):
+            self.occupancy = points_in_polygons(centers, self.zones).sum(axis=0)
+
+        self.trajectories.append(ids.tolist(), centers)
+        return crossings
+
+    def update_objects(self, tracked_objects):
+        """`update` from ObjectTracker output, centers taken from the boxes"""
+        if not tracked_objects:
+            return self.update([], [])
+        ids = [obj["object_id"] for obj in tracked_objects]
+        boxes = np.array([obj["bbox"] for obj in tracked_objects], dtype=np.float64)
+        return self.update(ids, (boxes[:, :2] + boxes[:, 2:]) / 2)
+
+    def forget(self, ids):
+        """Drop the trajectories of removed objects"""
+        self.trajectories.evict(ids)
+
+    def tracked(self):
+        return len(self.trajectories)
+
+    def stats(self):
+        return {"lines": [{"entry": int(entry), "exit": int(exit)} for exit, entry in self.counts],
+                "occupancy": dict(zip(self.zone_names, self.occupancy.tolist()))}
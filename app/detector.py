@@ -0,0 +1,278 @@
+import threading
+import numpy as np
+import cv2
+from postprocess import decode_batch
+
+
+class Detector:
+    """
+    Common interface of the YOLOv8 inference backends.
+
+    Backends implement `_forward`, which runs the network on a preprocessed
+    (B, 3, H, W) float32 tensor and returns the raw (B, 4 + num_classes,
+    anchors) head; preprocessing, decoding and box scaling are shared.
+
+    `batch_size` is the number of frames sent through the network at once.
+    Backends with `fixed_batch` (static engines) always receive exactly
+    `batch_size` frames, partial batches being zero-padded.
+
+    Each thread preprocesses into its own preallocated input tensor (see
+    `_allocate_host`), so the per-frame path does not allocate; tensors
+    returned by `preprocess`/`preprocess_batch` are reused by the next call.
+
+    Frames are stretched to the input size unless `letterbox` is set, in
+    which case they keep their aspect ratio and are padded with `pad_value`.
+    The placement is computed once per source resolution, so cameras of
+    different resolutions can share a detector; boxes are mapped back to
+    each frame's own shape (`original_shape` when none is given).
+
+    With `roi` (x1, y1, x2, y2), e.g. from `utils.roi_from_line`, only that
+    region of each frame (clamped to it) is resized and sent to the
+    network, so objects inside it get more input pixels; boxes are still
+    returned in full-frame coordinates. A crop is rarely square, so `roi`
+    is best combined with `letterbox`.
+
+    Frames may also arrive already reduced from a larger source, e.g.
+    decoded at `decode_size` by capture.FrameSource. Given each frame's
+    `source_shapes`, the roi (in source coordinates) is mapped onto the
+    frame and the boxes are mapped back to the source, so trackers and
+    counting lines keep working in source pixels.
+    """
+
+    fixed_batch = False
+
+    def __init__(self,
+                 original_shape=(720, 1280),
+                 input_shape=(1, 3, 640, 640),
+                 conf_threshold=0.3,
+                 iou_threshold=0.9,
+                 num_classes=80,
+                 classes=None,
+                 agnostic_nms=True,
+                 nms_engine="opencv",
+                 batch_size=1,
+                 letterbox=False,
+                 pad_value=114,
+                 roi=None):
+        self.batch_size = batch_size
+        self.input_shape = (batch_size,) + tuple(input_shape[1:])
+        self.output_shape = (batch_size, num_classes+4, 8400)
+        self.original_shape = original_shape
+        self.conf_threshold = conf_threshold
+        self.iou_threshold = iou_threshold
+        self.num_classes = num_classes
+        # Class ids to decode, e.g. [0] for person only; None keeps all.
+        self.classes = classes
+        self.agnostic_nms = agnostic_nms
+        # "opencv" (cv2.dnn.NMSBoxes) or "numpy" (nms.nms), see decode_batch
+        self.nms_engine = nms_engine
+        self.letterbox = letterbox
+        self.pad_value = np.float32(pad_value / 255.0)
+        self.roi = roi
+        # ((height, width), (source height, source width)) ->
+        #     ((x1, y1, x2, y2) of the crop, (new_w, new_h, left, top) of the
+        #      resized crop)
+        self._geometry_cache = dict()
+        self.local_data = threading.local()
+
+    def _forward(self, input_tensor):
+        raise NotImplementedError
+
+    def infer(self, frame, source_shape=None):
+        """Perform inference on a frame"""
+        return self.infer_batch([frame], None if source_shape is None else [source_shape])[0]
+
+    def infer_batch(self, frames, source_shapes=None):
+        """
+        Perform inference on a list of frames, `batch_size` frames per
+        forward pass; returns one (boxes, scores, class_ids) per frame,
+        boxes in the coordinates of `source_shapes` (the frames' own when
+        None).
+        """
+        if source_shapes is None:
+            source_shapes = [frame.shape for frame in frames]
+        results = []
+        for start in range(0, len(frames), self.batch_size):
+            chunk = frames[start:start + self.batch_size]
+            sources = source_shapes[start:start + self.batch_size]
+            output = self._forward(self.preprocess_batch(chunk, sources))
+            expected = self.batch_size if self.fixed_batch else len(chunk)
+            if len(output) != expected:
+                raise ValueError(f"Model returned {len(output)} results for a batch of "
+                                 f"{expected}; is it built for batch_size={self.batch_size}?")
+            results.extend(self.decode_batch_output(
+                output[:len(chunk)], [frame.shape for frame in chunk], sources))
+        return results
+
+    def _allocate_host(self, shape):
+        """Allocate a float32 host buffer; backends may override, e.g. to pin it"""
+        return np.empty(shape, dtype=np.float32)
+
+    def _input_buffer(self):
+        """This thread's (batch_size, 3, H, W) input tensor"""
+        if not hasattr(self.local_data, 'input_buffer'):
+            self.local_data.input_buffer = self._allocate_host(self.input_shape)
+            self.local_data.resize_buffers = dict()
+        return self.local_data.input_buffer
+
+    def _resize_buffer(self, new_h, new_w):
+        """This thread's uint8 buffer for frames resized to (new_h, new_w)"""
+        buffer = self.local_data.resize_buffers.get((new_h, new_w))
+        if buffer is None:
+            buffer = np.empty((new_h, new_w, 3), dtype=np.uint8)
+            self.local_data.resize_buffers[(new_h, new_w)] = buffer
+        return buffer
+
+    def _geometry(self, frame_shape, source_shape=None):
+        """Crop (x1, y1, x2, y2) of a frame of `frame_shape` and the
+        (new_w, new_h, left, top) placement of that crop inside the model
+        input; the frame may be a reduced copy of a `source_shape` frame"""
+        if source_shape is None:
+            source_shape = frame_shape
+        key = (tuple(frame_shape[:2]), tuple(source_shape[:2]))
+        geometry = self._geometry_cache.get(key)
+        if geometry is None:
+            (frame_h, frame_w), (source_h, source_w) = key
+            crop = (0, 0, frame_w, frame_h)
+            if self.roi is not None:
+                # The roi is in source coordinates
+                fx, fy = frame_w / source_w, frame_h / source_h
+                x1, y1, x2, y2 = self.roi
+                x1, x2 = round(x1 * fx), round(x2 * fx)
+                y1, y2 = round(y1 * fy), round(y2 * fy)
+                x1, x2 = min(max(x1, 0), frame_w - 1), min(max(x2, 1), frame_w)
+                y1, y2 = min(max(y1, 0), frame_h - 1), min(max(y2, 1), frame_h)
+                if x2 <= x1 or y2 <= y1:
+                    raise ValueError(f"roi {self.roi} lies outside {frame_w}x{frame_h} frames")
+                crop = (x1, y1, x2, y2)
+            height, width = crop[3] - crop[1], crop[2] - crop[0]
+            input_h, input_w = self.input_shape[2:]
+            if self.letterbox:
+                scale = min(input_h / height, input_w / width)
+                new_w, new_h = round(width * scale), round(height * scale)
+                placement = (new_w, new_h, (input_w - new_w) // 2, (input_h - new_h) // 2)
+            else:
+                placement = (input_w, input_h, 0, 0)
+            geometry = (crop, placement)
+            self._geometry_cache[key] = geometry
+        return geometry
+
+    def decode_size(self, source_shape):
+        """(width, height) to decode `source_shape` frames at so that their
+        crop already has the size it takes in the model input: frames of
+        that size go into the network without a resize. Never larger than
+        the source: a crop smaller than the model input is decoded at full
+        size and resized in preprocess_into instead."""
+        (x1, y1, x2, y2), (new_w, new_h, _, _) = self._geometry(source_shape)
+        source_h, source_w = source_shape[:2]
+        fx, fy = min(new_w / (x2 - x1), 1.0), min(new_h / (y2 - y1), 1.0)
+        return (round(source_w * fx), round(source_h * fy))
+
+    def _output_buffer(self):
+        """This thread's (batch_size, 4 + num_classes, anchors) output tensor"""
+        if not hasattr(self.local_data, 'output_buffer'):
+            self.local_data.output_buffer = self._allocate_host(self.output_shape)
+        return self.local_data.output_buffer
+
+    def preprocess_into(self, frame, out, source_shape=None):
+        """Crop to the roi, resize (or letterbox), scale to [0, 1] and write
+        `frame` into a (3, H, W) float32 view"""
+        (x1, y1, x2, y2), (new_w, new_h, left, top) = self._geometry(frame.shape, source_shape)
+        if (x1, y1, x2, y2) != (0, 0, frame.shape[1], frame.shape[0]):
+            frame = frame[y1:y2, x1:x2]  # A view, resized without a copy
+        if frame.shape[:2] == (new_h, new_w):
+            resized = frame
+        else:
+            resized = cv2.resize(frame, (new_w, new_h),
+                                 dst=self._resize_buffer(new_h, new_w))
+        if (new_h, new_w) != out.shape[1:]:
+            # Only the borders around the frame need padding
+            out[:, :top] = self.pad_value
+            out[:, top + new_h:] = self.pad_value
+            out[:, top:top + new_h, :left] = self.pad_value
+            out[:, top:top + new_h, left + new_w:] = self.pad_value
+        # HWC to CHW and the division in one pass, straight into the buffer
+        np.divide(resized.transpose(2, 0, 1), np.float32(255.0),
+                  out=out[:, top:top + new_h, left:left + new_w])
+        return out
+
+    def preprocess(self, frame):
+        """Resize, scale to [0, 1] and convert to a (1, 3, H, W) float32 tensor"""
+        return self.preprocess_batch([frame])
+
+    def preprocess_batch(self, frames, source_shapes=None):
+        """Preprocess up to `batch_size` frames into this thread's input tensor"""
+        input_tensor = self._input_buffer()
+        if source_shapes is None:
+            source_shapes = [None] * len(frames)
+        for i, (frame, source_shape) in enumerate(zip(frames, source_shapes)):
+            self.preprocess_into(frame, input_tensor[i], source_shape)
+        if not self.fixed_batch:
+            return input_tensor[:len(frames)]
+        input_tensor[len(frames):] = 0
+        return input_tensor
+
+    def decode_output(self, output_tensor, frame_shape=None):
+        return self.decode_batch_output(output_tensor[:1], [frame_shape])[0]
+
+    def decode_batch_output(self, output_tensor, frame_shapes=None, source_shapes=None):
+        """Decode a (B, 4 + num_classes, anchors) head, one result per frame"""
+        if frame_shapes is None:
+            frame_shapes = [None] * len(output_tensor)
+        if source_shapes is None:
+            source_shapes = [None] * len(output_tensor)
+        detections = decode_batch(
+            output_tensor,
+            conf_threshold=self.conf_threshold,
+            iou_threshold=self.iou_threshold,
+            num_classes=self.num_classes,
+            classes=self.classes,
+            agnostic=self.agnostic_nms,
+            nms_engine=self.nms_engine)
+        return [(self.scale_boxes(boxes, frame_shape, source_shape), scores, class_ids)
+                for (boxes, scores, class_ids), frame_shape, source_shape
+                in zip(detections, frame_shapes, source_shapes)]
+
+    def scale_boxes(self, boxes, frame_shape=None, source_shape=None):
+        # frame_shape: (height, width) of the original image
+        # source_shape: (height, width) it was reduced from, if any
+        # geometry: crop of the frame, size and offset of the resized crop
+        # in the model input
+        if frame_shape is None:
+            frame_shape = self.original_shape
+        (x1, y1, x2, y2), (new_w, new_h, left, top) = self._geometry(frame_shape, source_shape)
+        height, width = y2 - y1, x2 - x1
+
+        if self.letterbox:
+            boxes[:, [0, 2]] -= left  # Remove the padding
+            boxes[:, [1, 3]] -= top
+        boxes[:, [0, 2]] *= width / new_w   # Scale x coordinates
+        boxes[:, [1, 3]] *= height / new_h  # Scale y coordinates
+        if self.letterbox:
+            # Boxes may reach into the padding, keep them inside the crop
+            boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, width)
+            boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, height)
+        if (x1, y1) != (0, 0):
+            boxes[:, [0, 2]] += x1  # Back to full-frame coordinates
+            boxes[:, [1, 3]] += y1
+        if source_shape is not None and tuple(source_shape[:2]) != tuple(frame_shape[:2]):
+            boxes[:, [0, 2]] *= source_shape[1] / frame_shape[1]  # Back to the source
+            boxes[:, [1, 3]] *= source_shape[0] / frame_shape[0]
+        return boxes.astype(int)  # Convert to integers
+
+
+def create_detector(backend, model_path, **kwargs):
+    """
+    Build the detector for `backend`:
+        "tensorrt"     serialized TensorRT engine (needs pycuda + TensorRT)
+        "onnxruntime"  ONNX model on ONNX Runtime
+        "opencv"       ONNX model on OpenCV DNN (CPU only, no extra deps)
+    Backends are imported lazily so CPU-only hosts never load CUDA.
+    """
+    if backend == "tensorrt":
+        from yolov8_tensorrt import YOLOv8TensorRT
+        return YOLOv8TensorRT(engine_path=model_path, **kwargs)
+    if backend in ("onnxruntime", "opencv"):
+        from yolov8_onnx import YOLOv8ONNX
+        return YOLOv8ONNX(model_path=model_path, runtime=backend, **kwargs)
+    raise ValueError(f"Unknown detector backend: {backend}")
@@ -0,0 +1,141 @@
+import struct
+import threading
+import time
+from collections import defaultdict
+
+DIRECTIONS = ("entry", "exit")
+
+# Binary records, little endian, told apart by their first byte:
+#   window: type, flags, seq, start_ms, duration_ms, n_counts,
+#           [spool id (16 bytes)], stream name (1 byte length + utf-8),
+#           n_counts x (line, obj_class, direction, count)
+#   event:  type, flags, seq, time_ms, line, obj_class, direction,
+#           [spool id (16 bytes)], stream name (1 byte length + utf-8)
+WINDOW, EVENT = 1, 2
+HAS_SPOOL = 1
+_WINDOW = struct.Struct("<BBQqIH")
+_COUNT = struct.Struct("<BhBI")
+_EVENT = struct.Struct("<BBQqBhB")
+
+
+def _tail(record):
+    """Optional spool id and the stream name, shared by both record types"""
+    flags, tail = 0, b""
+    if "spool" in record:
+        flags |= HAS_SPOOL
+        tail += bytes.fromhex(record["spool"])
+    name = record.get("stream", "").encode("utf-8")[:255]
+    return flags, tail + bytes([len(name)]) + name
+
+
+def encode_binary(record):
+    """Pack a window record (see WindowAggregator) or a raw crossing event"""
+    flags, tail = _tail(record)
+    seq = record.get("seq", 0)
+    if "counts" in record:
+        counts = record["counts"]
+        return (_WINDOW.pack(WINDOW, flags, seq, record["start_ms"], record["duration_ms"],
+                             len(counts)) + tail
+                + b"".join(_COUNT.pack(line, obj_class, DIRECTIONS.index(direction), count)
+                           for line, obj_class, direction, count in counts))
+    return _EVENT.pack(EVENT, flags, seq, record["time_ms"], record.get("line", 0),
+                       record.get("obj_class", -1),
+                       DIRECTIONS.index(record["direction"])) + tail
+
+
+def decode_binary(data):
+    """Inverse of `encode_binary`"""
+    kind = data[0]
+    layout = _WINDOW if kind == WINDOW else _EVENT
+    fields = layout.unpack_from(data)
+    offset = layout.size
+    record = dict()
+    if fields[1] & HAS_SPOOL:
+        record["spool"] = data[offset:offset + 16].hex()
+        offset += 16
+    if fields[2]:
+        record["seq"] = fields[2]
+    length = data[offset]
+    record["stream"] = data[offset + 1:offset + 1 + length].decode("utf-8")
+    offset += 1 + length
+    if kind == WINDOW:
+        record.update(start_ms=fields[3], duration_ms=fields[4], counts=list())
+        for _ in range(fields[5]):
+            line, obj_class, direction, count = _COUNT.unpack_from(data, offset)
+            record["counts"].append([line, obj_class, DIRECTIONS[direction], count])
+            offset += _COUNT.size
+    else:
+        record.update(time_ms=fields[3], line=fields[4], obj_class=fields[5],
+                      direction=DIRECTIONS[fields[6]])
+    return record
+
+
+class WindowAggregator(threading.Thread):
+    """
+    Rolls crossing events into counts per stream, line, class and direction
+    over tumbling windows of each length in `windows` (seconds), and puts
+    one record per stream and closed window into `msg_queue`:
+
+        {"stream": ..., "start_ms": ..., "duration_ms": ...,
+         "counts": [[line, obj_class, direction, count], ...]}
+
+    Windows without crossings are not sent. Like the publisher it stands
+    in for the runners' `msg_queue`; with `raw` every event is forwarded
+    as well, for audits. `clock` (seconds since the epoch) can be replaced
+    to replay recorded events.
+    """
+
+    def __init__(self, msg_queue, windows=(10,), raw=False, clock=time.time):
+        super().__init__(name="window-aggregator", daemon=True)
+        self.msg_queue = msg_queue
+        self.windows = [int(seconds * 1000) for seconds in windows]
+        self.raw = raw
+        self.clock = clock
+        self.events = 0
+        self.published = 0
+        # duration_ms -> start_ms -> stream -> (line, class, direction) -> count
+        self._counts = {duration: defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
+                        for duration in self.windows}
+        self._closing = threading.Event()
+        self._lock = threading.Lock()
+
+    def put(self, event):
+        key = (event.get("line", 0), event.get("obj_class", -1), event["direction"])
+        with self._lock:
+            now_ms = int(self.clock() * 1000)
+            self.events += 1
+            for duration, windows in self._counts.items():
+                start = now_ms - now_ms % duration
+                windows[start][event.get("stream", "")][key] += 1
+        if self.raw:
+            self.msg_queue.put(event)
+
+    def run(self):
+        shortest = min(self.windows) / 1000
+        while not self._closing.wait(shortest - self.clock() % shortest):
+            self.flush(int(self.clock() * 1000))
+        self.flush()
+
+    def flush(self, now_ms=None):
+        """Publish the windows closed by `now_ms`, or all of them when None"""
+        closed = list()
+        with self._lock:
+            for duration, windows in self._counts.items():
+                for start in sorted(windows):
+                    if now_ms is not None and start + duration > now_ms:
+                        continue
+                    closed.append((start, duration, windows.pop(start)))
+        for start, duration, streams in closed:
+            for stream, counts in streams.items():
+                self.msg_queue.put({"stream": stream, "start_ms": start,
+                                    "duration_ms": duration,
+                                    "counts": [[*key, count] for key, count in counts.items()]})
+                self.published += 1
+
+    def close(self):
+        """Publish the open windows, partial ones included"""
+        self._closing.set()
+        self.join()
+
+    def stats(self):
+        return {"events": self.events, "published": self.published}
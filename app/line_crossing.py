@@ -1,10 +1,15 @@
-import cv2
 import logging
-from utils import (calculate_center, has_crossed_line,
-                   update_obj_history, draw_tracking_bbox, write_output_video)
+import time
+from utils import draw_tracking_bbox
 
 from queue import Queue
-from yolov8_tensorrt import YOLOv8TensorRT
+from capture import FrameSource
+from counting import CrossingCounter
+from detector import create_detector
+from motion import MotionGate
+from pipeline import Pipeline, Stage
+from stride import AdaptiveStride
+from video_sink import VideoSink
 from tracker.byte_tracker import BYTETracker
 import threading
 
@@ -13,55 +18,200 @@ logger = logging.getLogger(__name__)
 
 
 class LineCrossing(threading.Thread):
-    def __init__(self, source, model, tracker: BYTETracker, line, msg_queue: Queue):
+    def __init__(self, source, model, tracker: BYTETracker, line, msg_queue: Queue,
+                 classes=None, backend="tensorrt", detector_options=None,
+                 batch_size=1, max_wait=None, queue_size=4, backpressure="block",
+                 detect_workers=1, annotate=True, output_path="../../output.mp4",
+                 sink_options=None, max_stride=1, fps=30, motion_options=None,
+                 zones=None, capture_options=None, decode_at_input=False):
         super().__init__()
-        self.model = YOLOv8TensorRT(engine_path=model)
+        self.model = create_detector(backend, model, classes=classes,
+                                     batch_size=batch_size,
+                                     **(detector_options or {}))
+        # Frames are detected batch_size at a time; with max_wait (seconds) a
+        # batch is cut short once that long has passed since its first frame
+        # was read, bounding the added latency on live streams.
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        # Capture, detection, tracking and drawing run as pipeline stages;
+        # backpressure applies to the capture -> detect queue.
+        self.queue_size = queue_size
+        self.backpressure = backpressure
+        self.detect_workers = detect_workers
+        self.pipeline = None
+        # Annotated frames stream to output_path through a VideoSink
+        # (sink_options: fps, codec, segment_seconds, segment_bytes, ...);
+        # with annotate off nothing is drawn or written.
+        self.annotate = annotate
+        self.output_path = output_path
+        self.sink_options = sink_options or dict()
+        self.sink = None
+        # With max_stride > 1 detection runs on one frame in k, k adapting to
+        # activity near the line and detector load; the tracker coasts on
+        # Kalman prediction over the skipped frames.
+        self.stride = None
+        if max_stride > 1:
+            self.stride = AdaptiveStride(line, max_stride=max_stride, fps=fps)
+        # With motion_options (see motion.MotionGate) frames where nothing
+        # moves inside the detector's roi skip detection the same way.
+        self.motion = None
+        if motion_options is not None:
+            self.motion = MotionGate(**{"roi": self.model.roi, **motion_options})
+        # Frames are decoded on their own thread (see capture.FrameSource for
+        # capture_options: mode, gstreamer, reconnect backoff, ...). With
+        # decode_at_input they are reduced to the size they take in the model
+        # input, keeping the full-size frames only to annotate them;
+        # detections are still in source coordinates.
         self.source = source
+        self.capture_options = capture_options or dict()
+        if decode_at_input:
+            self.capture_options.update(size=self.model.decode_size, keep_full=annotate)
+        self.capture = None
         self.line = line
         self.msg_queue = msg_queue
         self.tracker = tracker
-        self.obj_history = dict()
-        self.runnig = False
+        # Crossings of `line` and occupancy of the `zones` polygons ({name: [(x, y), ...]})
+        self.counter = CrossingCounter([line], zones)
+        self.running = False
 
     def process_tracks(self, tracked_ojects):
-        for obj in tracked_ojects:
-            object_id = obj["object_id"]
-            bbox = obj["bbox"]
-
-            center = calculate_center(bbox=bbox)
-            prev_center = self.obj_history.get(object_id, None)
-            line_is_crossed, direction = has_crossed_line(prev_center,
-                                                          center,
-                                                          self.line)
-            if line_is_crossed:
-                logging.info(f"Object {object_id}: {direction} ")
-                self.msg_queue.put({"direction": direction})
-
-            self.obj_history = update_obj_history(
-                object_histories=self.obj_history,
-                object_id=object_id,
-                center=center)
-
-    def run(self):
-        self.runnig = True
-        cap = cv2.VideoCapture(self.source)
-        out_frames = list()
-        while cap.isOpened():
+        classes = {obj["object_id"]: obj["obj_class"] for obj in tracked_ojects}
+        for object_id, _, direction in self.counter.update_objects(tracked_ojects):
+            logging.info(f"Object {object_id}: {direction} ")
+            if self.msg_queue is not None:
+                self.msg_queue.put({"direction": direction,
+                                    "obj_class": classes[object_id]})
 
+    def read_batch(self, cap):
+        """Read up to batch_size frames, stopping early at max_wait or end of
+        stream, and their full-size copies (None unless reduced ones are read)"""
+        frames, fulls = list(), list()
+        deadline = None
+        while len(frames) < self.batch_size:
+            if deadline is not None and time.monotonic() >= deadline:
+                break
             ret, frame = cap.read()
             if not ret:
+                break
+            frames.append(frame)
+            fulls.append(cap.full)
+            if deadline is None and self.max_wait is not None:
+                deadline = time.monotonic() + self.max_wait
+        return frames, fulls
+
+    def read_batches(self, cap):
+        """Yield batches of frames, their full-size copies and which of them
+        go through the detector (None: all), until the stream ends. Stride
+        and motion decide here, on the reading thread, so that they see the
+        frames in order however many detect workers there are."""
+        while cap.isOpened() and self.running:
+            frames, fulls = self.read_batch(cap)
+            if not frames:
                 logger.error("Stream ended or error occured")
                 break
+            due = None
+            if self.stride is not None or self.motion is not None:
+                due = [self.due(frame) for frame in frames]
+            yield frames, fulls, due
+
+    def source_shape(self):
+        """(height, width) of the source when frames are read reduced, else None"""
+        return None if self.capture is None else self.capture.source_shape
+
+    def source_shapes(self, count):
+        source_shape = self.source_shape()
+        return None if source_shape is None else [source_shape] * count
+
+    def due(self, frame):
+        """Whether `frame` goes through the detector"""
+        if self.motion is not None and not self.motion.check(frame, self.source_shape()):
+            return False
+        return self.stride is None or self.stride.due()
 
-            bboxes, scores, class_ids = self.model.infer(frame=frame)
-            tracked_objects = self.tracker.track_objects(bboxes, scores, (720, 1280))
-            # self.process_tracks(tracked_objects)
+    def detect(self, batch):
+        frames, fulls, due = batch
+        if due is None:
+            return frames, fulls, self.model.infer_batch(frames, self.source_shapes(len(frames)))
+
+        selected = [frame for frame, detect in zip(frames, due) if detect]
+        start = time.perf_counter()
+        detections = iter(self.model.infer_batch(selected, self.source_shapes(len(selected))))
+        if selected and self.stride is not None:
+            self.stride.observe_load((time.perf_counter() - start) / len(selected))
+        # None marks the frames the tracker has to coast through
+        return frames, fulls, [next(detections) if detect else None for detect in due]
+
+    def track(self, batch):
+        tracked = list()
+        for frame, full, detection in zip(*batch):
+            if detection is None:
+                tracked_objects = self.tracker.advance_objects()
+            else:
+                bboxes, scores, class_ids = detection
+                image_shape = self.source_shape() or frame.shape[:2]
+                tracked_objects = self.tracker.track_objects(bboxes, scores, image_shape,
+                                                             class_ids)
+            if self.stride is not None:
+                self.stride.observe(tracked_objects,
+                                    None if detection is None else len(detection[0]))
+            self.process_tracks(tracked_objects)
+            self.counter.forget(self.tracker.pop_removed_ids())
+            # Boxes are in source coordinates: draw on the full-size frame
+            tracked.append((frame if full is None else full, tracked_objects))
+        return tracked
+
+    def draw(self, tracked):
+        for frame, tracked_objects in tracked:
             for obj in tracked_objects:
-                out_frames.append(draw_tracking_bbox(frame=frame,
-                                                     bbox=obj["bbox"],
-                                                     obj_id=obj["object_id"]))
+                frame = draw_tracking_bbox(frame=frame,
+                                           bbox=obj["bbox"],
+                                           obj_id=obj["object_id"])
+            self.sink.write(frame)
+
+    def build_pipeline(self, cap):
+        stages = [
+            Stage("detect", self.detect, workers=self.detect_workers,
+                  maxsize=self.queue_size, policy=self.backpressure),
+            Stage("track", self.track, maxsize=self.queue_size),
+        ]
+        if self.annotate:
+            stages.append(Stage("annotate", self.draw, maxsize=self.queue_size))
+        return Pipeline(self.read_batches(cap), stages)
 
-        write_output_video(out_frames, output_path="../../output.mp4")
+    def queue_depths(self):
+        if self.pipeline is None:
+            return dict()
+        return self.pipeline.queue_depths()
+
+    def stats(self):
+        stats = self.counter.stats()
+        stats["tracks"] = self.counter.tracked()
+        if self.pipeline is not None:
+            stats["pipeline"] = self.pipeline.stats()
+        if self.stride is not None:
+            stats["stride"] = {"stride": self.stride.stride,
+                               "skip_ratio": self.stride.skip_ratio()}
+        if self.motion is not None:
+            stats["motion"] = self.motion.stats()
+        if self.capture is not None:
+            stats["capture"] = self.capture.stats()
+        return stats
+
+    def run(self):
+        self.running = True
+        cap = self.capture = FrameSource(self.source, **self.capture_options).start()
+        if self.annotate:
+            self.sink = VideoSink(self.output_path, **self.sink_options)
+        self.pipeline = self.build_pipeline(cap)
+        self.pipeline.run()
+        cap.release()
+        if self.annotate:
+            self.sink.close()
+        logger.info(f"Stats: {self.stats()}")
 
     def stop(self):
-        self.running = False
\ No newline at end of file
+        self.running = False
+        if self.capture is not None:
+            self.capture.release()
+        if self.pipeline is not None:
+            self.pipeline.stop()
@@ -1,58 +1,231 @@
 import click
 from line_crossing import LineCrossing
+from multi_stream import MultiStreamRunner, load_config
+from process_pool import Supervisor
 from queue import Queue
 import threading
-from msghandler import MessageHandler
+from events import WindowAggregator, encode_binary
+from msghandler import EventPublisher
+from spool import EventSpool
 import os
 import logging
 from typing import List
 from object_tracker import ObjectTracker
+from utils import roi_from_line
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-msg_queue = list()
-
-def event_streaming(bootstrap_server: str, topic: str):
-    handler = MessageHandler(bootstrap_server=bootstrap_server,
-                             topic=topic)
-    while True:
-        if len(msg_queue) > 0:
-            data = msg_queue[0]
-
-            sucess = handler.send_event(**data)
-            if sucess:
-                msg_queue.pop[0]
-            else:
-                continue
-
 
 @click.command()
 @click.option("--source", type=str, help="rtsp link or video path")
+@click.option("--config", type=str, default=None,
+              help="JSON file declaring several streams and their lines")
+@click.option("--workers", type=int, default=0,
+              help="with --config, shard streams over this many processes "
+                   "(0 runs them all as threads of one process)")
+@click.option("--output", type=str, default="../../output.mp4",
+              help="annotated video path")
+@click.option("--no_annotate", is_flag=True, default=False,
+              help="count only, skip drawing and writing the annotated video")
+@click.option("--segment_seconds", type=float, default=None,
+              help="start a new output file every this many seconds of video")
+@click.option("--segment_mb", type=float, default=None,
+              help="start a new output file once the current one reaches this size")
 @click.option("--model", type=str, help="model artifact")
 @click.option("--bootstrap_server", type=str, default="localhost:9092", help="ip:port for kafka broker")
 @click.option("--topic", type=str, help="kafka topic where to push event")
-def main(source, model, bootstrap_server, topic):
+@click.option("--linger_ms", type=int, default=20,
+              help="how long the kafka producer waits to batch events")
+@click.option("--compression", type=click.Choice(["gzip", "snappy", "lz4", "zstd", "none"]),
+              default="gzip", help="kafka batch compression")
+@click.option("--encoding", type=click.Choice(["json", "binary"]), default="json",
+              help="kafka record encoding (see events.encode_binary)")
+@click.option("--windows", type=str, default=None,
+              help="comma separated window lengths in seconds, e.g. 1,10,60: "
+                   "publish counts per window instead of each crossing")
+@click.option("--raw_events", is_flag=True, default=False,
+              help="with --windows, still publish every crossing for audits")
+@click.option("--spool_dir", type=str, default=None,
+              help="write events to this directory first, so they survive "
+                   "broker outages and restarts")
+@click.option("--spool_mb", type=float, default=256,
+              help="with --spool_dir, disk limit; the oldest undelivered events go first")
+@click.option("--spool_hours", type=float, default=None,
+              help="with --spool_dir, drop undelivered events older than this")
+@click.option("--gated", is_flag=True, default=False,
+              help="grid-gated sparse association for crowded scenes")
+@click.option("--classes", type=str, default=None,
+              help="comma separated class ids to detect, e.g. 0 for person")
+@click.option("--backend", type=click.Choice(["tensorrt", "onnxruntime", "opencv"]),
+              default="tensorrt", help="inference backend for --model")
+@click.option("--threads", type=int, default=None,
+              help="CPU inference threads (onnxruntime/opencv backends)")
+@click.option("--providers", type=str, default=None,
+              help="comma separated onnxruntime execution providers")
+@click.option("--letterbox", is_flag=True, default=False,
+              help="keep the frame aspect ratio, padding to the model input")
+@click.option("--roi_margin", type=int, default=None,
+              help="only detect within this many pixels around the counting "
+                   "line (single --source)")
+@click.option("--batch_size", type=int, default=None,
+              help="frames per detector forward pass (default 1; more needs "
+                   "a model or engine built for that batch)")
+@click.option("--max_wait", type=float, default=None,
+              help="max milliseconds to wait for a batch to fill (live sources)")
+@click.option("--max_stride", type=int, default=1,
+              help="adaptive detection stride: detect at most every Nth frame "
+                   "when the scene allows it (1 detects every frame)")
+@click.option("--motion_threshold", type=float, default=None,
+              help="skip detection unless this fraction of the roi differs "
+                   "from a running-average background, e.g. 0.005 (off by default)")
+@click.option("--motion_refresh", type=int, default=10,
+              help="with --motion_threshold, still detect at least every N frames "
+                   "(tracks are reported on prediction alone for at most 10)")
+@click.option("--capture", type=click.Choice(["auto", "latest", "lossless"]), default="auto",
+              help="latest: decode ahead and keep only the newest frame (live "
+                   "default), lossless: never skip a frame (file default)")
+@click.option("--gstreamer", is_flag=True, default=False,
+              help="decode and convert to BGR through a GStreamer pipeline")
+@click.option("--hw_decode", is_flag=True, default=False,
+              help="with --gstreamer, scale and convert on the Jetson (nvvidconv)")
+@click.option("--decode_at_input", is_flag=True, default=False,
+              help="read frames reduced to the detector input size; full size "
+                   "frames are only kept for annotation")
+@click.option("--reconnect_max", type=float, default=30,
+              help="max seconds between attempts to reopen a lost live stream")
+@click.option("--queue_size", type=int, default=4,
+              help="capacity of the queues between pipeline stages")
+@click.option("--backpressure", type=click.Choice(["block", "drop_oldest", "drop_newest"]),
+              default="block", help="what capture does when detection falls behind")
+@click.option("--detect_workers", type=int, default=1,
+              help="detection threads")
+def main(source, config, workers, output, no_annotate, segment_seconds, segment_mb,
+         model, bootstrap_server, topic, linger_ms, compression, encoding,
+         windows, raw_events, spool_dir,
+         spool_mb, spool_hours, gated, classes, backend, threads,
+         providers, letterbox, roi_margin, batch_size, max_wait, max_stride,
+         motion_threshold, motion_refresh, capture, gstreamer, hw_decode, decode_at_input,
+         reconnect_max, queue_size, backpressure, detect_workers):
     source = os.getenv("source", source)
+    config = os.getenv("config", config)
     bootstrap_server = os.getenv("bootstrap_server", bootstrap_server) 
     topic = os.getenv("topic", topic)
-    tracker = ObjectTracker(track_thresh=0.6, match_thresh=0.9,
-                            track_buffer=60, mot20=False)
-    line = [(750, 200), (950, 1250)]
+    classes = os.getenv("classes", classes)
+    if classes is not None:
+        classes = [int(c) for c in classes.split(",")]
+    backend = os.getenv("backend", backend)
+    detector_options = dict(letterbox=letterbox)
+    if backend != "tensorrt":
+        detector_options["num_threads"] = threads
+        if providers is not None:
+            detector_options["providers"] = providers.split(",")
+    if max_wait is not None:
+        max_wait = max_wait / 1000
+    capture_options = dict(mode=capture, gstreamer=gstreamer, hardware=hw_decode,
+                           max_backoff=reconnect_max)
+
+    # Crossing events go to kafka when a topic is set, optionally rolled
+    # into windowed counts first
+    msg_queue = publisher = aggregator = None
+    if topic is not None:
+        spool = None
+        if spool_dir is not None:
+            spool = EventSpool(spool_dir, max_bytes=int(spool_mb * 1024 * 1024),
+                               retention_seconds=spool_hours * 3600 if spool_hours else None)
+        msg_queue = publisher = EventPublisher.from_bootstrap(
+            bootstrap_server, topic, linger_ms=linger_ms,
+            compression=None if compression == "none" else compression,
+            encode=encode_binary if encoding == "binary" else None,
+            spool=spool)
+        publisher.start()
+        if windows is not None:
+            msg_queue = aggregator = WindowAggregator(
+                publisher, [float(w) for w in windows.split(",")], raw=raw_events)
+            aggregator.start()
+    try:
+        if config is not None:
+            run_streams(config, workers, model, msg_queue, gated, classes, backend,
+                        detector_options, batch_size, max_wait, capture_options,
+                        decode_at_input)
+            return
+
+        # Tracks stay reported across the frames the stride skips
+        tracker = ObjectTracker(track_thresh=0.6, match_thresh=0.9,
+                                track_buffer=60, mot20=False, gated=gated,
+                                max_coast=max(10, max_stride))
+        sink_options = dict(segment_seconds=segment_seconds)
+        if segment_mb is not None:
+            sink_options["segment_bytes"] = int(segment_mb * 1024 * 1024)
+        line = [(750, 200), (950, 1250)]
+        if roi_margin is not None:
+            detector_options["roi"] = roi_from_line(line, roi_margin)
+
+        motion_options = None
+        if motion_threshold is not None:
+            motion_options = dict(min_area=motion_threshold, refresh_interval=motion_refresh)
 
-    line_crossing = LineCrossing(source=source, model=model, tracker=tracker,
-                                 line=line, msg_queue=msg_queue)
+        line_crossing = LineCrossing(source=source, model=model, tracker=tracker,
+                                     line=line, msg_queue=msg_queue,
+                                     classes=classes, backend=backend,
+                                     detector_options=detector_options,
+                                     batch_size=batch_size or 1,
+                                     max_wait=max_wait,
+                                     queue_size=queue_size,
+                                     backpressure=backpressure,
+                                     detect_workers=detect_workers,
+                                     annotate=not no_annotate,
+                                     output_path=output,
+                                     sink_options=sink_options,
+                                     max_stride=max_stride,
+                                     motion_options=motion_options,
+                                     capture_options=capture_options,
+                                     decode_at_input=decode_at_input)
 
-    #event_streaming_thread = threading.Thread(target=event_streaming,
-    #                                          kwargs={"bootstrap_server":
-    #                                                  bootstrap_server,
-    #                                                 "topic": topic})
+        line_crossing.start()
+        line_crossing.join()
+    finally:
+        if aggregator is not None:
+            aggregator.close()
+            logger.info(f"Windows: {aggregator.stats()}")
+        if publisher is not None:
+            publisher.close()
+            logger.info(f"Events: {publisher.stats()}")
 
-    line_crossing.start()
-    #event_streaming_thread.start()
 
-    line_crossing.join()
-    #event_streaming_thread.join()
+def run_streams(config, workers, model, msg_queue, gated, classes, backend,
+                detector_options, batch_size, max_wait, capture_options, decode_at_input):
+    """Run the cameras of a --config file, in `workers` processes or as threads;
+    `capture_options` are the defaults for each stream's "capture" options"""
+    config = load_config(config)
+    for stream in config["streams"]:
+        stream["capture"] = {**capture_options, **stream.get("capture", {})}
+    runner_options = dict()
+    if batch_size is not None:
+        runner_options["batch_size"] = batch_size
+    if max_wait is not None:
+        runner_options["max_wait"] = max_wait
+    if workers > 0:
+        if decode_at_input:
+            logger.warning("--decode_at_input needs the detector in the capture process; "
+                           "give the streams a capture \"size\" instead with --workers")
+        supervisor = Supervisor(config, model=model, workers=workers,
+                                tracker_options=dict(gated=gated),
+                                msg_queue=msg_queue,
+                                backend=backend, classes=classes,
+                                detector_options=detector_options,
+                                **runner_options)
+        supervisor.run()
+        return
+    runner = MultiStreamRunner.from_config(config, model=model,
+                                           msg_queue=msg_queue,
+                                           tracker_options=dict(gated=gated),
+                                           backend=backend, classes=classes,
+                                           detector_options=detector_options,
+                                           decode_at_input=decode_at_input,
+                                           **runner_options)
+    runner.start()
+    runner.join()
 
 
 if __name__ == "__main__":
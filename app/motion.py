@@ -0,0 +1,96 @@
+import threading
+
+import cv2
+import numpy as np
+
+
+class MotionGate(object):
+    """
+    Cheap activity check run before the detector: the `roi` of each frame
+    (whole frame when None; in the coordinates of the frame's source when
+    it was read reduced) is shrunk to `width` pixels wide, converted to
+    grey and blurred, then compared with a running average of the previous
+    ones (updated with weight `learning_rate`, so lighting drift and
+    objects left standing fade into the background). The frame counts as
+    moving when more than `min_area` of its pixels differ from that
+    background by over `pixel_threshold` grey levels.
+
+    Detection keeps running for `hold` frames after the last motion, so
+    tracks are updated while objects leave, and is forced at least every
+    `refresh_interval` frames so tracks never coast on prediction alone for
+    long (BYTETracker.advance stops reporting a track `max_coast` frames,
+    10 by default, after its last detection).
+    """
+
+    def __init__(self, roi=None, width=160, pixel_threshold=25, min_area=0.005,
+                 learning_rate=0.05, hold=5, refresh_interval=10):
+        self.roi = roi
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.min_area = min_area
+        self.learning_rate = learning_rate
+        self.hold = hold
+        self.refresh_interval = refresh_interval
+        self.frames = 0
+        self.moving = 0
+        self.forced = 0
+        self.skipped = 0
+        self._background = None
+        self._since_motion = hold
+        self._since_pass = 0
+        self._lock = threading.Lock()
+
+    def _small(self, frame, source_shape=None):
+        if self.roi is not None:
+            x1, y1, x2, y2 = self.roi
+            if source_shape is not None:
+                fx, fy = frame.shape[1] / source_shape[1], frame.shape[0] / source_shape[0]
+                x1, x2, y1, y2 = round(x1 * fx), round(x2 * fx), round(y1 * fy), round(y2 * fy)
+            frame = frame[max(y1, 0):y2, max(x1, 0):x2]
+        height, width = frame.shape[:2]
+        size = (self.width, max(1, round(height * self.width / width)))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        return cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+
+    def motion(self, small):
+        """Fraction of pixels of `small` that differ from the background,
+        which is then updated with it"""
+        if self._background is None or self._background.shape != small.shape:
+            self._background = small.astype(np.float32)
+            return 1.0
+        changed = cv2.absdiff(small, cv2.convertScaleAbs(self._background)) > self.pixel_threshold
+        cv2.accumulateWeighted(small, self._background, self.learning_rate)
+        return changed.mean()
+
+    def check(self, frame, source_shape=None):
+        """Whether `frame` (reduced from a `source_shape` one, if given)
+        should go through the detector"""
+        small = self._small(frame, source_shape)
+        with self._lock:
+            self.frames += 1
+            moving = self.motion(small) > self.min_area
+            if moving:
+                self.moving += 1
+                self._since_motion = 0
+            else:
+                self._since_motion += 1
+            if self._since_motion <= self.hold:
+                self._since_pass = 0
+                return True
+            self._since_pass += 1
+            if self._since_pass >= self.refresh_interval:
+                self.forced += 1
+                self._since_pass = 0
+                return True
+            self.skipped += 1
+            return False
+
+    def skip_ratio(self):
+        return self.skipped / max(self.frames, 1)
+
+    def stats(self):
+        return {"frames": self.frames,
+                "moving": self.moving,
+                "forced": self.forced,
+                "skipped": self.skipped,
+                "skip_ratio": self.skip_ratio()}
@@ -1,41 +1,218 @@
-from kafka import KafkaProducer
-import logging
-import json
 import datetime
-from time import sleep
+import json
+import logging
+import threading
+import time
+from queue import Full
+
+from pipeline import BoundedQueue, STOP
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-class MessageHandler:
-    def __init__(self, bootstrap_server, topic):
-        self.bootstrap_server = bootstrap_server
+class EventPublisher(threading.Thread):
+    """
+    Non-blocking crossing event publisher.
+
+    Runners hand events to `put` (it stands in for their `msg_queue`); they
+    are timestamped and queued in a bounded queue, and this thread passes
+    them to `producer.send` without waiting for the outcome. The producer
+    batches and compresses records on its own I/O thread (see
+    `from_bootstrap` for the linger/batch/compression settings) and reports
+    each delivery through callbacks, which keep the ack counters and the
+    put-to-ack latency. `backpressure` decides what `put` does when the
+    broker cannot keep up (see pipeline.BoundedQueue).
+
+    With a `spool` (spool.EventSpool) events are written to disk first
+    instead: this thread drains the spool up to `max_in_flight` unacked
+    events ahead, acks advance the spool's watermark, and a failed delivery
+    rewinds to the oldest failed event and retries with exponential backoff
+    (latency is then measured from the send). Nothing is lost to an outage
+    or a restart short of the spool's own retention limits.
+
+    Records are JSON unless `encode` turns them into bytes first, e.g.
+    events.encode_binary.
+
+    `producer` is anything with KafkaProducer's `send`/`flush`/`close`,
+    e.g. an in-process fake broker for tests and benchmarks. Alternatively
+    `connect` creates it on this thread, retried with backoff, so the
+    broker does not need to be reachable at start-up.
+    """
+
+    def __init__(self, producer, topic, queue_size=10000, backpressure="drop_oldest",
+                 connect=None, encode=None, spool=None, drain_batch=500, max_in_flight=10000,
+                 sync_interval=0.5, retry_backoff=1.0, max_backoff=30.0):
+        super().__init__(name="event-publisher", daemon=True)
+        self.producer = producer
         self.topic = topic
-        self.producer = KafkaProducer(
-            bootstrap_servers=self.bootstrap_server,
-            value_serializer=lambda v: json.dumps(v).encode('utf-8'),
-            acks='all'
-            )
-
-    def send_event(self, direction, cls):
-        time_stamp = datetime.datetime.now()
-        time_stamp = time_stamp.strftime("%Y-%m-%dT%H:%M:%S")
-        data = {"time_stamp": str(time_stamp),
-                "direction": direction,
-                "obj_class": cls}
-
-        def on_success(record_metadata):
-            nonlocal success
-            success = True
-
-        def on_error(ex):
-            nonlocal success
-            success = False
-            logger.error("Failed to send message")
-
-        success = None
-        future = self.producer.send(self.topic, value=data)
-        future.add_callback(on_success).add_errback(on_error)
-        sleep(5)
-        return success
+        self.queue = BoundedQueue(queue_size, backpressure)
+        self.connect = connect
+        self.encode = encode
+        self.spool = spool
+        self.drain_batch = drain_batch
+        self.max_in_flight = max_in_flight
+        self.sync_interval = sync_interval
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self.sent = 0
+        self.acked = 0
+        self.failed = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.started = None
+        self._backoff = retry_backoff
+        self._rewind = None  # lowest spooled seq whose delivery failed
+        self._closing = False
+        self._wakeup = threading.Condition()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_bootstrap(cls, bootstrap_server, topic, linger_ms=20, batch_bytes=64 * 1024,
+                       compression="gzip", acks="all", retries=5, **kwargs):
+        def connect():
+            from kafka import KafkaProducer
+            return KafkaProducer(
+                bootstrap_servers=bootstrap_server,
+                value_serializer=lambda v: v if isinstance(v, bytes) else json.dumps(v).encode('utf-8'),
+                acks=acks,
+                retries=retries,
+                linger_ms=linger_ms,
+                batch_size=batch_bytes,
+                compression_type=compression,
+                )
+        return cls(None, topic, connect=connect, **kwargs)
+
+    def put(self, event):
+        now = datetime.datetime.now()
+        event = {"time_stamp": now.strftime("%Y-%m-%dT%H:%M:%S"),
+                 "time_ms": int(now.timestamp() * 1000), **event}
+        if self.spool is None:
+            self.queue.put((time.monotonic(), event))
+            return
+        self.spool.append(event)
+        with self._wakeup:
+            self._wakeup.notify()
+
+    def _wait(self, timeout):
+        """Sleep up to `timeout` seconds; True once close() was called"""
+        with self._wakeup:
+            if not self._closing:
+                self._wakeup.wait(timeout)
+            return self._closing
+
+    def run(self):
+        self.started = time.monotonic()
+        while self.producer is None:
+            try:
+                self.producer = self.connect()
+            except Exception as ex:
+                logger.error(f"Cannot reach the broker, retrying in {self._backoff:.0f}s: {ex}")
+                if self._wait(self._backoff):
+                    return
+                self._backoff = min(self._backoff * 2, self.max_backoff)
+        self._backoff = self.retry_backoff
+        if self.spool is None:
+            self._send_queued()
+        else:
+            self._send_spooled()
+
+    def _send_queued(self):
+        while True:
+            item = self.queue.get()
+            if item is STOP:
+                break
+            queued, data = item
+            self._send(data, queued)
+
+    def _send_spooled(self):
+        cursor = self.spool.acked + 1
+        synced = time.monotonic()
+        while True:
+            if time.monotonic() - synced >= self.sync_interval:
+                self.spool.sync()
+                synced = time.monotonic()
+            with self._lock:
+                rewind, self._rewind = self._rewind, None
+            if rewind is not None:
+                logger.warning(f"Delivery failed, resending from event {rewind} "
+                               f"in {self._backoff:.0f}s")
+                if self._wait(self._backoff):
+                    break
+                self._backoff = min(self._backoff * 2, self.max_backoff)
+                cursor = max(rewind, self.spool.acked + 1)
+                continue
+            room = self.max_in_flight - (cursor - 1 - self.spool.acked)
+            records = self.spool.read(cursor, min(self.drain_batch, room)) if room > 0 else []
+            if not records:
+                if self._wait(self.sync_interval):
+                    break
+                continue
+            for record in records:
+                self._send(record, time.monotonic())
+            cursor = records[-1]["seq"] + 1
+
+    def _send(self, data, queued):
+        seq = data.get("seq") if self.spool is not None else None
+        with self._lock:
+            self.sent += 1
+        try:
+            value = data if self.encode is None else self.encode(data)
+            future = self.producer.send(self.topic, value=value)
+        except Exception as ex:
+            self._on_error(seq, ex)
+            return
+        future.add_callback(self._on_success, queued, seq)
+        future.add_errback(self._on_error, seq)
+
+    def _on_success(self, queued, seq, record_metadata):
+        latency = time.monotonic() - queued
+        if seq is not None:
+            self.spool.ack(seq)
+        with self._lock:
+            self.acked += 1
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+            self._backoff = self.retry_backoff
+
+    def _on_error(self, seq, ex):
+        with self._lock:
+            self.failed += 1
+            if seq is not None:
+                self._rewind = seq if self._rewind is None else min(self._rewind, seq)
+        logger.error(f"Failed to send event: {ex}")
+
+    def close(self, timeout=None):
+        """Send the queued events, wait for their acks and close the producer;
+        spooled events still undelivered are kept for the next run"""
+        with self._wakeup:
+            self._closing = True
+            self._wakeup.notify()
+        while self.spool is None and self.is_alive():
+            try:
+                self.queue.put(STOP, timeout=0.1)
+                break
+            except Full:  # The thread gave up connecting and no longer reads
+                pass
+        self.join(timeout)
+        if self.producer is not None:
+            self.producer.flush(timeout)
+            self.producer.close()
+        if self.spool is not None:
+            self.spool.close()
+
+    def stats(self):
+        with self._lock:
+            elapsed = time.monotonic() - self.started if self.started else 0.0
+            stats = {"queued": self.queue.qsize(),
+                     "dropped": self.queue.dropped,
+                     "sent": self.sent,
+                     "acked": self.acked,
+                     "failed": self.failed,
+                     "in_flight": self.sent - self.acked - self.failed,
+                     "throughput": self.acked / elapsed if elapsed else 0.0,
+                     "latency_mean": self.latency_total / max(self.acked, 1),
+                     "latency_max": self.latency_max}
+        if self.spool is not None:
+            stats["spool"] = self.spool.stats()
+        return stats
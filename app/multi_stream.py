@@ -0,0 +1,286 @@
+import json
+import logging
+import threading
+import time
+from queue import Empty
+
+from capture import FrameSource
+from counting import CrossingCounter
+from detector import create_detector
+from object_tracker import ObjectTracker
+from pipeline import BoundedQueue, Stage, STOP
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_TRACKER = dict(track_thresh=0.6, match_thresh=0.9, track_buffer=60, mot20=False)
+
+
+def load_config(path):
+    """
+    Read a multi-camera config:
+
+        {
+          "batch_size": 8,
+          "max_wait_ms": 20,
+          "tracker": {"track_thresh": 0.6, "match_thresh": 0.9, ...},
+          "streams": [
+            {"name": "gate-1", "source": "rtsp://...",
+             "lines": [[[750, 200], [950, 1250]]],
+             "zones": {"queue": [[600, 300], [900, 300], [900, 700], [600, 700]]},
+             "backpressure": "drop_oldest",
+             "capture": {"gstreamer": true, "max_backoff": 30}},
+            ...
+          ]
+        }
+
+    Only "streams" with their "source" and "lines" are required; "zones"
+    are polygons whose occupancy is counted, "capture" holds
+    capture.FrameSource options. "backpressure" defaults to "drop_oldest"
+    for live sources and "block" for files (see CameraStream).
+    """
+    with open(path) as f:
+        config = json.load(f)
+    streams = config.get("streams")
+    if not streams:
+        raise ValueError(f"{path}: no streams configured")
+    for index, stream in enumerate(streams):
+        if "source" not in stream or not stream.get("lines"):
+            raise ValueError(f"{path}: stream {index} needs a source and lines")
+        stream.setdefault("name", f"stream-{index}")
+        stream["lines"] = [tuple(tuple(point) for point in line)
+                           for line in stream["lines"]]
+        stream["zones"] = {name: [tuple(point) for point in polygon]
+                           for name, polygon in stream.get("zones", {}).items()}
+    return config
+
+
+class CameraStream(object):
+    """
+    One camera: a capture thread feeding a bounded frame queue, and a
+    tracking stage with the stream's own ObjectTracker, counting lines and
+    occupancy zones. The queue's `backpressure` defaults to "drop_oldest"
+    for sources captured in "latest" mode (live) and to "block" otherwise,
+    so files keep every frame.
+    """
+
+    def __init__(self, name, source, lines, tracker: ObjectTracker,
+                 msg_queue=None, queue_size=2, backpressure=None, zones=None,
+                 capture_options=None):
+        self.name = name
+        self.source = source
+        self.lines = lines
+        self.tracker = tracker
+        self.msg_queue = msg_queue
+        # Decoding runs on the capture thread; `frames` already decides what
+        # is dropped, so the source adds no queue of its own.
+        self.frame_source = FrameSource(source, **(capture_options or {}))
+        if backpressure is None:
+            backpressure = "drop_oldest" if self.frame_source.latest else "block"
+        self.frames = BoundedQueue(queue_size, backpressure)
+        self.track_stage = Stage(f"{name}/track", self.track, maxsize=queue_size)
+        self.counter = CrossingCounter(lines, zones)
+        # finished: capture ended; closed: the tracker was told so, after the
+        # stream's last batched frames were handed over
+        self.finished = False
+        self.closed = False
+        self.processed = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self._capture_thread = None
+
+    def start(self, running, notify):
+        self.track_stage.start()
+        self._capture_thread = threading.Thread(target=self.capture, args=(running, notify),
+                                                name=f"{self.name}/capture", daemon=True)
+        self._capture_thread.start()
+
+    def join(self, timeout=None):
+        self._capture_thread.join(timeout)
+        self.track_stage.join(timeout)
+
+    def capture(self, running, notify):
+        for captured, frame, _ in self.frame_source.frames(running.is_set):
+            self.frames.put((captured, frame))
+            notify()
+        if running.is_set():
+            logger.error(f"{self.name}: stream ended or error occured")
+        self.frames.put(STOP)
+        notify()
+
+    def track(self, item):
+        captured, frame, (bboxes, scores, class_ids) = item
+        # Boxes are in source coordinates, also when frames are read reduced
+        image_shape = self.frame_source.source_shape or frame.shape[:2]
+        tracked_objects = self.tracker.track_objects(bboxes, scores, image_shape, class_ids)
+        self.process_tracks(tracked_objects)
+        self.counter.forget(self.tracker.pop_removed_ids())
+
+        latency = time.monotonic() - captured
+        self.processed += 1
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+
+    def process_tracks(self, tracked_objects):
+        classes = {obj["object_id"]: obj["obj_class"] for obj in tracked_objects}
+        for object_id, index, direction in self.counter.update_objects(tracked_objects):
+            logger.info(f"{self.name} line {index}: object {object_id} {direction}")
+            if self.msg_queue is not None:
+                self.msg_queue.put({"stream": self.name, "line": index,
+                                    "obj_class": classes[object_id],
+                                    "direction": direction})
+
+    def stats(self):
+        return {"processed": self.processed,
+                "dropped": self.frames.dropped,
+                "queued": self.frames.qsize(),
+                "latency_mean": self.latency_total / max(self.processed, 1),
+                "latency_max": self.latency_max,
+                "tracks": self.counter.tracked(),
+                "capture": self.frame_source.stats(),
+                **self.counter.stats()}
+
+
+class FairScheduler(object):
+    """
+    Builds detector batches from the frames ready on each stream.
+
+    Streams are visited round-robin, one frame per stream per round, with
+    the starting stream rotating between batches, so a busy camera cannot
+    crowd the others out. Only frames already captured are taken: a stalled
+    camera simply has nothing to contribute, and once a batch holds a frame
+    it is sent after at most `max_wait` seconds whether or not it is full.
+    """
+
+    def __init__(self, streams, batch_size, max_wait=0.02):
+        self.streams = streams
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self._ready = threading.Condition()
+        self._cursor = 0
+
+    def notify(self):
+        with self._ready:
+            self._ready.notify()
+
+    def _collect(self, batch):
+        progress = True
+        while progress and len(batch) < self.batch_size:
+            progress = False
+            for i in range(len(self.streams)):
+                if len(batch) >= self.batch_size:
+                    break
+                stream = self.streams[(self._cursor + i) % len(self.streams)]
+                if stream.finished:
+                    continue
+                try:
+                    item = stream.frames.get_nowait()
+                except Empty:
+                    continue
+                if item is STOP:
+                    stream.finished = True
+                    continue
+                batch.append((stream, item))
+                progress = True
+        self._cursor = (self._cursor + 1) % len(self.streams)
+
+    def next_batch(self):
+        """Return the next [(stream, (captured, frame)), ...], empty once every stream ended"""
+        batch = list()
+        deadline = None
+        with self._ready:
+            while True:
+                self._collect(batch)
+                if len(batch) >= self.batch_size:
+                    break
+                if all(stream.finished for stream in self.streams):
+                    break
+                if not batch:
+                    self._ready.wait(0.1)
+                    continue
+                if self.max_wait is None:
+                    self._ready.wait(0.1)
+                    continue
+                now = time.monotonic()
+                if deadline is None:
+                    deadline = now + self.max_wait
+                if now >= deadline:
+                    break
+                self._ready.wait(deadline - now)
+        return batch
+
+
+class MultiStreamRunner(threading.Thread):
+    """
+    Runs many cameras against one shared detector: each stream captures and
+    tracks on its own threads, while this thread pulls fair cross-stream
+    batches from the scheduler through a single `infer_batch` call. With
+    `decode_at_input`, streams without a capture "size" of their own read
+    frames reduced to the size they take in the model input.
+    """
+
+    def __init__(self, streams, model, backend="tensorrt", classes=None,
+                 detector_options=None, batch_size=1, max_wait=0.02, decode_at_input=False):
+        super().__init__()
+        self.streams = streams
+        self.model = create_detector(backend, model, classes=classes,
+                                     batch_size=batch_size,
+                                     **(detector_options or {}))
+        if decode_at_input:
+            for stream in streams:
+                if stream.frame_source.size is None:
+                    stream.frame_source.size = self.model.decode_size
+        self.scheduler = FairScheduler(streams, batch_size, max_wait)
+        self.running = threading.Event()
+
+    @classmethod
+    def from_config(cls, config, model, msg_queue=None, tracker_options=None, **kwargs):
+        tracker_options = {**DEFAULT_TRACKER, **config.get("tracker", {}),
+                           **(tracker_options or {})}
+        streams = [CameraStream(name=stream["name"],
+                                source=stream["source"],
+                                lines=stream["lines"],
+                                zones=stream.get("zones"),
+                                tracker=ObjectTracker(**tracker_options),
+                                msg_queue=msg_queue,
+                                queue_size=stream.get("queue_size", 2),
+                                backpressure=stream.get("backpressure"),
+                                capture_options=stream.get("capture"))
+                   for stream in config["streams"]]
+        # One frame per forward pass unless asked: engines are often static batch 1
+        kwargs.setdefault("batch_size", config.get("batch_size", 1))
+        if "max_wait_ms" in config:
+            kwargs.setdefault("max_wait", config["max_wait_ms"] / 1000)
+        return cls(streams, model, **kwargs)
+
+    def run(self):
+        self.running.set()
+        for stream in self.streams:
+            stream.start(self.running, self.scheduler.notify)
+        while True:
+            batch = self.scheduler.next_batch()
+            if not batch:
+                break
+            detections = self.model.infer_batch(
+                [frame for _, (_, frame) in batch],
+                [stream.frame_source.source_shape for stream, _ in batch])
+            for (stream, (captured, frame)), detection in zip(batch, detections):
+                stream.track_stage.inbox.put((captured, frame, detection))
+            self._close_finished()
+        self._close_finished()
+        for stream in self.streams:
+            stream.join()
+        for stream in self.streams:
+            logger.info(f"{stream.name}: {stream.stats()}")
+
+    def _close_finished(self):
+        for stream in self.streams:
+            if stream.finished and not stream.closed:
+                stream.track_stage.inbox.put(STOP)
+                stream.closed = True
+
+    def stop(self):
+        self.running.clear()
+
+    def stats(self):
+        return {stream.name: stream.stats() for stream in self.streams}
@@ -0,0 +1,100 @@
+import numpy as np
+
+
+def _overlap_mask(coords, areas, a, b, iou_threshold):
+    """
+    Boolean (len(a), len(b)) matrix of pairs whose IoU exceeds the threshold.
+
+    IoU > t is tested as inter > t / (1 + t) * (area_a + area_b), which
+    avoids forming the union and dividing.
+    """
+    x1, y1, x2, y2 = coords
+    w = np.minimum(x2[a, None], x2[b])
+    w -= np.maximum(x1[a, None], x1[b])
+    h = np.minimum(y2[a, None], y2[b])
+    h -= np.maximum(y1[a, None], y1[b])
+    np.maximum(w, 0, out=w)
+    np.maximum(h, 0, out=h)
+    w *= h
+    return w > iou_threshold / (1 + iou_threshold) * (areas[a, None] + areas[b])
+
+
+def _resolve_block(overlaps):
+    """
+    Greedy keep/suppress decisions inside one score-sorted block.
+
+    `overlaps` is upper triangular (row i may suppress the later column j).
+    Each round keeps every undecided box that no kept or undecided box can
+    suppress any more and drops every box overlapped by a kept one; the
+    number of rounds is the length of the longest suppression chain rather
+    than the size of the block.
+    """
+    kept = np.zeros(len(overlaps), dtype=bool)
+    undecided = np.ones(len(overlaps), dtype=bool)
+    while undecided.any():
+        blocked = overlaps[kept | undecided].any(axis=0)
+        kept |= undecided & ~blocked
+        undecided &= blocked
+        undecided &= ~overlaps[kept].any(axis=0)
+    return kept
+
+
+def nms(boxes, scores, iou_threshold, top_k=None, block=32):
+    """
+    Greedy non-maximum suppression on (x1, y1, x2, y2) boxes.
+
+    Follows cv2.dnn.NMSBoxes: candidates are visited in descending score
+    order (stable on ties), only the `top_k` best are considered, and a box
+    is dropped when its IoU with an already kept box exceeds
+    `iou_threshold`.
+
+    Candidates are taken `block` at a time: the greedy order inside a block
+    is resolved with a few vectorised rounds, and the boxes kept there
+    suppress the whole tail in one step. A block without overlaps is kept
+    outright, so sparse or small candidate sets exit after a single pass.
+
+    Returns the indices of the kept boxes, best score first.
+    """
+    order = np.argsort(-np.asarray(scores), kind='stable')
+    if top_k is not None and top_k > 0:
+        order = order[:top_k]
+    if len(order) <= 1:
+        return order
+
+    coords = np.ascontiguousarray(np.asarray(boxes, dtype=np.float64)[order].T)
+    x1, y1, x2, y2 = coords
+    areas = (x2 - x1) * (y2 - y1)
+
+    keep = []
+    remaining = np.arange(len(order))
+    while len(remaining) > 0:
+        head, tail = remaining[:block], remaining[block:]
+        overlaps = np.triu(_overlap_mask(coords, areas, head, head, iou_threshold), k=1)
+        if overlaps.any():
+            head = head[_resolve_block(overlaps)]
+        keep.append(head)
+        if len(tail) == 0:
+            break
+        suppressed = _overlap_mask(coords, areas, head, tail, iou_threshold).any(axis=0)
+        remaining = tail[~suppressed]
+    return order[np.concatenate(keep)]
+
+
+def batched_nms(boxes, scores, idxs, iou_threshold, top_k=None, block=32):
+    """
+    NMS applied independently within each group of `idxs`.
+
+    Groups are separated by shifting each one's boxes by a multiple of the
+    coordinate range, so boxes from different groups never overlap and a
+    single `nms` pass covers all of them. `idxs` can hold class ids for
+    per-class NMS, or e.g. `frame * num_classes + class_id` to suppress
+    several frames or tiles at once.
+
+    Returns the indices of the kept boxes, best score first.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64)
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.intp)
+    offsets = np.asarray(idxs, dtype=np.float64) * (boxes.max() - boxes.min() + 1)
+    shifted = boxes - boxes.min() + offsets[:, None]
+    return nms(shifted, scores, iou_threshold, top_k, block)
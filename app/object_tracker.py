@@ -17,18 +17,31 @@ class ObjectTracker:
             detections.append([*bbox, score])
         return np.array(detections)
 
-    def track_objects(self, bboxs, scores, image_size):
+    def track_objects(self, bboxs, scores, image_size, class_ids=None):
 
         if bboxs.shape[0] == 0:
-            return []
-
-        detections = self.perepare_tracker_input(
-            bboxes=bboxs,
-            scores=scores
-        )
+            # Still update, so tracks whose object is gone get marked lost
+            detections = np.empty((0, 5))
+        else:
+            detections = self.perepare_tracker_input(
+                bboxes=bboxs,
+                scores=scores
+            )
         online_targets = self.tracker.update(torch.from_numpy(detections),
                                              img_size=image_size,
-                                             img_info=list(image_size))
+                                             img_info=list(image_size),
+                                             classes=class_ids)
+        return self.format_tracks(online_targets)
+
+    def advance_objects(self):
+        """Tracks predicted one frame ahead, for frames without detection"""
+        return self.format_tracks(self.tracker.advance())
+
+    def pop_removed_ids(self):
+        """Ids of the tracks removed since the previous call"""
+        return self.tracker.pop_removed_ids()
+
+    def format_tracks(self, online_targets):
         tracked_objects = []
         for track in online_targets:
             track_id = track.track_id
@@ -36,5 +49,6 @@ class ObjectTracker:
             tracked_objects.append({
                 "object_id": track_id,
                 "bbox": bbox.tolist(),
+                "obj_class": track.obj_class,
             })
         return tracked_objects
\ No newline at end of file
@@ -0,0 +1,182 @@
+import logging
+import threading
+import time
+from queue import Queue
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# End-of-stream marker passed down the stages; never dropped.
+STOP = object()
+
+
+class BoundedQueue(Queue):
+    """
+    Queue with a backpressure policy applied when it is full:
+        "block"        the producer waits for room
+        "drop_oldest"  the oldest queued item is discarded (latest wins)
+        "drop_newest"  the incoming item is discarded
+    Discarded items are counted in `dropped`.
+    """
+
+    POLICIES = ("block", "drop_oldest", "drop_newest")
+
+    def __init__(self, maxsize, policy="block"):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown backpressure policy: {policy}")
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        super().__init__(maxsize)
+        self.policy = policy
+        self.dropped = 0
+
+    def put(self, item, block=True, timeout=None):
+        if self.policy == "block" or item is STOP:
+            return super().put(item, block, timeout)
+        with self.not_full:
+            if self._qsize() >= self.maxsize:
+                self.dropped += 1
+                if self.policy == "drop_newest":
+                    return
+                self._get()
+                self.unfinished_tasks -= 1
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+
+class Stage(object):
+    """
+    One pipeline step: `workers` threads take items from the stage's own
+    bounded inbox, call `fn(item)` and pass non-None results to the next
+    stage. With several workers, results are still emitted in input order.
+    """
+
+    def __init__(self, name, fn, workers=1, maxsize=4, policy="block"):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.inbox = BoundedQueue(maxsize, policy)
+        self.outbox = None
+        self.processed = 0
+        self.busy = 0.0  # seconds spent inside fn
+        self._threads = []
+        self._in_lock = threading.Lock()
+        self._order = threading.Condition()
+        self._next_in = 0
+        self._next_out = 0
+        self._alive = 0
+        self._stopped = False
+
+    def start(self):
+        self._alive = self.workers
+        self._stopped = False
+        self._threads = [threading.Thread(target=self._work, name=f"{self.name}-{i}",
+                                          daemon=True)
+                         for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def join(self, timeout=None):
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _work(self):
+        while True:
+            with self._in_lock:
+                if self._stopped:
+                    break
+                item = self.inbox.get()
+                if item is STOP:
+                    self._stopped = True
+                    break
+                seq = self._next_in
+                self._next_in += 1
+
+            start = time.perf_counter()
+            try:
+                result = self.fn(item)
+            except Exception:
+                logger.exception(f"Stage {self.name} failed, dropping item")
+                result = None
+            elapsed = time.perf_counter() - start
+
+            with self._order:
+                self._order.wait_for(lambda: self._next_out == seq)
+                if result is not None and self.outbox is not None:
+                    self.outbox.put(result)
+                self.processed += 1
+                self.busy += elapsed
+                self._next_out += 1
+                self._order.notify_all()
+
+        with self._order:
+            self._alive -= 1
+            last = self._alive == 0
+        # The last worker out has seen every earlier item emitted
+        if last and self.outbox is not None:
+            self.outbox.put(STOP)
+
+
+class Pipeline(object):
+    """
+    Threaded chain of stages connected by bounded queues.
+
+    A source thread iterates over `source` and feeds the first stage; each
+    stage runs on its own thread(s), so throughput approaches that of the
+    slowest stage rather than the sum of all of them. The last stage's
+    results are discarded; use it as the sink. `stats()` exposes the queue
+    depth, drops and load of every stage.
+    """
+
+    def __init__(self, source, stages):
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+        self.source = source
+        self.stages = list(stages)
+        for stage, next_stage in zip(self.stages, self.stages[1:]):
+            stage.outbox = next_stage.inbox
+        self._stop = threading.Event()
+        self._source_thread = threading.Thread(target=self._feed, name="source",
+                                               daemon=True)
+
+    def _feed(self):
+        inbox = self.stages[0].inbox
+        try:
+            for item in self.source:
+                if self._stop.is_set():
+                    break
+                inbox.put(item)
+        except Exception:
+            logger.exception("Pipeline source failed")
+        finally:
+            inbox.put(STOP)
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+        self._source_thread.start()
+
+    def stop(self):
+        """Stop reading the source; queued items are still processed"""
+        self._stop.set()
+
+    def join(self, timeout=None):
+        self._source_thread.join(timeout)
+        for stage in self.stages:
+            stage.join(timeout)
+
+    def run(self):
+        self.start()
+        self.join()
+
+    def queue_depths(self):
+        return {stage.name: stage.inbox.qsize() for stage in self.stages}
+
+    def stats(self):
+        return {stage.name: {"depth": stage.inbox.qsize(),
+                             "maxsize": stage.inbox.maxsize,
+                             "dropped": stage.inbox.dropped,
+                             "processed": stage.processed,
+                             "busy": stage.busy}
+                for stage in self.stages}
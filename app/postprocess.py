@@ -0,0 +1,111 @@
+import cv2
+import numpy as np
+
+from nms import nms, batched_nms
+
+NMS_ENGINES = ("opencv", "numpy")
+
+
+def decode_predictions(output_tensor, conf_threshold, iou_threshold,
+                       num_classes=80, classes=None, top_k=1000, agnostic=True,
+                       nms_engine="opencv"):
+    """
+    Decode a raw YOLOv8 head of shape (1, 4 + num_classes, anchors).
+
+    Returns (boxes, scores, class_ids) with boxes as (x1, y1, x2, y2) in
+    model input pixels; see `decode_batch`.
+    """
+    return decode_batch(output_tensor[:1], conf_threshold, iou_threshold,
+                        num_classes=num_classes, classes=classes,
+                        top_k=top_k, agnostic=agnostic, nms_engine=nms_engine)[0]
+
+
+def decode_batch(output_tensor, conf_threshold, iou_threshold,
+                 num_classes=80, classes=None, top_k=1000, agnostic=True,
+                 nms_engine="opencv"):
+    """
+    Decode a raw YOLOv8 head of shape (B, 4 + num_classes, anchors) in one pass.
+
+    Only the class rows listed in `classes` are read (all of them when None),
+    anchors of every frame are thresholded on their best score before any box
+    math, and the arg-max over classes and the box conversion run on the
+    survivors only. NMS then runs per frame, class-agnostic unless `agnostic`
+    is False, over at most the `top_k` best candidates of each frame, with
+    cv2.dnn.NMSBoxes / NMSBoxesBatched or, with `nms_engine="numpy"`, the
+    NumPy engine in `nms` (slower than OpenCV at the usual few hundred
+    candidates, see benchmarks/bench_nms.py).
+
+    Returns one (boxes, scores, class_ids) tuple per frame with boxes as
+    (x1, y1, x2, y2) in model input pixels.
+    """
+    if nms_engine not in NMS_ENGINES:
+        raise ValueError(f"Unknown NMS engine: {nms_engine}")
+    batch_size = len(output_tensor)
+    if classes is None:
+        cls_scores = output_tensor[:, 4:num_classes + 4]
+    else:
+        classes = np.asarray(classes, dtype=np.intp)
+        cls_scores = output_tensor[:, classes + 4]
+
+    if cls_scores.shape[1] == 1:
+        conf_scores = cls_scores[:, 0]
+    else:
+        conf_scores = cls_scores.max(axis=1)
+    frame_idx, anchor_idx = np.nonzero(conf_scores > conf_threshold)
+
+    if (top_k is not None and top_k > 0 and len(frame_idx) > top_k
+            and np.bincount(frame_idx).max() > top_k):
+        # Keep the top_k best candidates of each frame, like NMSBoxes does
+        # for a single one; ties stay in anchor order.
+        order = np.lexsort((-conf_scores[frame_idx, anchor_idx], frame_idx))
+        sorted_frames = frame_idx[order]
+        rank = np.arange(len(order)) - np.searchsorted(sorted_frames, sorted_frames)
+        keep = np.sort(order[rank < top_k])
+        frame_idx, anchor_idx = frame_idx[keep], anchor_idx[keep]
+    conf_scores = conf_scores[frame_idx, anchor_idx]
+
+    if cls_scores.shape[1] == 1:
+        class_ids = np.zeros(len(frame_idx), dtype=np.intp)
+    else:
+        class_ids = cls_scores[frame_idx, :, anchor_idx].argmax(axis=1)
+    if classes is not None:
+        class_ids = classes[class_ids]
+
+    # (cx, cy, w, h) -> (x1, y1, x2, y2)
+    cx, cy, w, h = output_tensor[frame_idx, :4, anchor_idx].T
+    boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+
+    # Candidates come out of np.nonzero grouped by frame. NMS runs per frame:
+    # one pass over the whole batch would compare boxes across frames too.
+    bounds = np.searchsorted(frame_idx, np.arange(batch_size + 1))
+    detections = []
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        frame_boxes = boxes[start:stop]
+        frame_scores = conf_scores[start:stop]
+        frame_class_ids = class_ids[start:stop]
+        if nms_engine == "opencv":
+            nms_indices = opencv_nms(frame_boxes, frame_scores, frame_class_ids,
+                                     conf_threshold, iou_threshold, agnostic)
+        elif agnostic:
+            nms_indices = nms(frame_boxes, frame_scores, iou_threshold)
+        else:
+            nms_indices = batched_nms(frame_boxes, frame_scores, frame_class_ids,
+                                      iou_threshold)
+        detections.append((frame_boxes[nms_indices], frame_scores[nms_indices],
+                           frame_class_ids[nms_indices]))
+    return detections
+
+
+def opencv_nms(boxes, scores, class_ids, conf_threshold, iou_threshold, agnostic=True):
+    """cv2.dnn.NMSBoxes (or NMSBoxesBatched per class) on (x1, y1, x2, y2)
+    boxes; returns the kept indices as an array, best score first"""
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.intp)
+    xywh = boxes.copy()
+    xywh[:, 2:] -= xywh[:, :2]  # (x1, y1, x2, y2) -> (x, y, w, h) as expected by NMS
+    if agnostic:
+        nms_indices = cv2.dnn.NMSBoxes(xywh, scores, conf_threshold, iou_threshold)
+    else:
+        nms_indices = cv2.dnn.NMSBoxesBatched(xywh, scores, class_ids.astype(np.int32),
+                                              conf_threshold, iou_threshold)
+    return np.asarray(nms_indices, dtype=np.intp).reshape(-1)
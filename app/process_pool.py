@@ -0,0 +1,415 @@
+import itertools
+import logging
+import multiprocessing as mp
+import threading
+import time
+from multiprocessing import shared_memory
+from queue import Empty
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class FrameRing(object):
+    """
+    Fixed-size uint8 frame slots in one shared memory block.
+
+    The supervisor creates one ring per camera worker; the worker writes
+    decoded frames into free slots and the inference process reads them in
+    place, so frames cross process boundaries without being pickled. Only
+    (slot, shape) travels over the queues.
+    """
+
+    def __init__(self, slots, max_frame_shape, name=None, create=True):
+        self.slots = slots
+        self.max_frame_shape = tuple(max_frame_shape)
+        self.slot_bytes = int(np.prod(self.max_frame_shape))
+        # Workers are spawned by the supervisor and share its resource
+        # tracker, so the block is unlinked once, by its creator.
+        self.shm = shared_memory.SharedMemory(name=name, create=create,
+                                              size=slots * self.slot_bytes)
+
+    @property
+    def spec(self):
+        return self.slots, self.max_frame_shape, self.shm.name
+
+    @classmethod
+    def attach(cls, spec):
+        slots, max_frame_shape, name = spec
+        return cls(slots, max_frame_shape, name=name, create=False)
+
+    def fits(self, shape):
+        return int(np.prod(shape)) <= self.slot_bytes
+
+    def view(self, slot, shape):
+        return np.ndarray(shape, dtype=np.uint8, buffer=self.shm.buf,
+                          offset=slot * self.slot_bytes)
+
+    def close(self):
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+def _collect_requests(requests, batch_size, max_wait):
+    """Block for one request, then gather more until the batch is full or
+    max_wait has passed; None in the batch means shut down."""
+    batch = [requests.get()]
+    deadline = time.monotonic() + (max_wait or 0)
+    while len(batch) < batch_size and batch[-1] is not None:
+        timeout = deadline - time.monotonic()
+        try:
+            batch.append(requests.get(timeout=timeout) if timeout > 0
+                         else requests.get_nowait())
+        except Empty:
+            break
+    return batch
+
+
+def inference_worker(model, backend, detector_kwargs, batch_size, max_wait,
+                     requests, detections, ring_specs):
+    """
+    Run the shared detector on the frames camera workers announce. Requests
+    are (worker, generation, stream, slot, token, shape, source_shape,
+    captured), source_shape being None unless the frame was read reduced,
+    and are answered on `detections` with the same fields plus (boxes,
+    scores, class_ids).
+    """
+    from detector import create_detector
+    detector = create_detector(backend, model, batch_size=batch_size, **detector_kwargs)
+    rings = [FrameRing.attach(spec) for spec in ring_specs]
+    running = True
+    while running:
+        batch = _collect_requests(requests, batch_size, max_wait)
+        if batch[-1] is None:
+            batch.pop()
+            running = False
+        if not batch:
+            continue
+        frames, source_shapes = list(), list()
+        for worker, generation, stream, slot, token, shape, source_shape, captured in batch:
+            frames.append(rings[worker].view(slot, shape))
+            source_shapes.append(source_shape)
+        for request, detection in zip(batch, detector.infer_batch(frames, source_shapes)):
+            detections.put(request + (detection,))
+    for ring in rings:
+        ring.close()
+
+
+class SlotPool(object):
+    """
+    Free slots of a worker's ring. Every acquisition gets a new token that
+    travels with the request; a slot is freed only by the answer carrying
+    its current token, so a late answer for an earlier use of the slot
+    cannot free it while a newer frame is in flight.
+    """
+
+    def __init__(self, slots):
+        self._free = list(range(slots))
+        self._pending = dict()  # slot -> token of the request using it
+        self._tokens = itertools.count()
+        self._released = threading.Condition()
+
+    def acquire(self, block=False, running=lambda: True):
+        """(slot, token) of a free slot, or None when there is none and
+        `block` is False or `running()` turned false while waiting"""
+        with self._released:
+            while block and not self._free and running():
+                self._released.wait(0.1)
+            if not self._free:
+                return None
+            slot, token = self._free.pop(), next(self._tokens)
+            self._pending[slot] = token
+            return slot, token
+
+    def release(self, slot, token):
+        with self._released:
+            if self._pending.get(slot) == token:
+                del self._pending[slot]
+                self._free.append(slot)
+                self._released.notify()
+
+    def pending(self):
+        with self._released:
+            return len(self._pending)
+
+
+class EventChannel(object):
+    """`msg_queue` stand-in tagging crossing events for the worker's outbox"""
+
+    def __init__(self, outbox):
+        self.outbox = outbox
+
+    def put(self, event):
+        self.outbox.put(("event", event))
+
+
+def camera_worker(index, generation, streams, tracker_options, ring_spec,
+                  outbox, inbox, stop_event, slot_timeout):
+    """
+    Capture a shard of streams into the worker's ring, announce the filled
+    slots on `outbox` and track/count the detections arriving on `inbox`
+    (None for requests the supervisor knows were lost); crossing events
+    also go out on `outbox`. When the ring is full, streams with the
+    "block" backpressure (the default for non-live sources, see
+    CameraStream) wait for a slot, the others drop the frame just read.
+    Once capture has ended, answers still pending are waited for at most
+    `slot_timeout` seconds.
+    """
+    from multi_stream import CameraStream
+    from object_tracker import ObjectTracker
+
+    ring = FrameRing.attach(ring_spec)
+    slots = SlotPool(ring.slots)
+    cameras = [CameraStream(name=stream["name"], source=stream["source"],
+                            lines=stream["lines"],
+                            zones=stream.get("zones"),
+                            backpressure=stream.get("backpressure"),
+                            tracker=ObjectTracker(**tracker_options),
+                            msg_queue=EventChannel(outbox),
+                            capture_options=stream.get("capture"))
+               for stream in streams]
+
+    def capture(stream_index, camera, block):
+        source = camera.frame_source
+        for captured, frame, _ in source.frames(lambda: not stop_event.is_set()):
+            if not ring.fits(frame.shape):
+                logger.error(f"{camera.name}: {frame.shape} frame exceeds the ring slot size")
+                break
+            acquired = slots.acquire(block, lambda: not stop_event.is_set())
+            if acquired is None:
+                # Inference is behind, the newest frame is the one to drop
+                camera.frames.dropped += 1
+                continue
+            slot, token = acquired
+            ring.view(slot, frame.shape)[...] = frame
+            outbox.put(("frame", (index, generation, stream_index, slot, token, frame.shape,
+                                  source.source_shape, captured)))
+        else:
+            if not stop_event.is_set():
+                logger.error(f"{camera.name}: stream ended or error occured")
+
+    threads = [threading.Thread(target=capture, daemon=True,
+                                args=(i, camera, camera.frames.policy == "block"))
+               for i, camera in enumerate(cameras)]
+    for thread in threads:
+        thread.start()
+
+    deadline = None
+    while slots.pending() or any(thread.is_alive() for thread in threads):
+        if not any(thread.is_alive() for thread in threads):
+            deadline = deadline or time.monotonic() + slot_timeout
+            if time.monotonic() > deadline:
+                logger.warning(f"camera-{index}: {slots.pending()} frames still in flight, "
+                               "exiting without their detections")
+                break
+        try:
+            stream_index, slot, token, shape, _, captured, detection = inbox.get(timeout=0.1)
+        except Empty:
+            continue
+        if detection is not None:
+            cameras[stream_index].track((captured, ring.view(slot, shape), detection))
+        slots.release(slot, token)
+
+    for camera in cameras:
+        logger.info(f"{camera.name}: {camera.stats()}")
+    ring.close()
+
+
+class Channel(object):
+    """
+    Queue pair between the supervisor and one process generation.
+
+    A process killed while holding a multiprocessing.Queue lock leaves that
+    queue unusable, so every queue has the supervisor at one end and is
+    replaced, with the process, on restart.
+    """
+
+    def __init__(self, ctx):
+        self.outbox = ctx.Queue()  # process -> supervisor
+        self.inbox = ctx.Queue()   # supervisor -> process
+        self.closed = threading.Event()
+
+
+class Supervisor(object):
+    """
+    Shards the configured streams over `workers` camera processes sharing one
+    inference process, and restarts any of them that crashes.
+
+    Each camera worker captures its streams, tracks and counts them on its
+    own core, while frames reach the inference process through the worker's
+    shared-memory FrameRing. Only slot announcements, detections and
+    crossing events travel over queues, routed by the supervisor; crossing
+    events are forwarded to `msg_queue` if given. Frames in flight when a
+    process dies are skipped: requests queued to or being run by a crashed
+    inference process are answered as lost, which frees their slots, and
+    answers for a crashed camera worker are dropped. `slot_timeout` bounds
+    how long a worker whose streams ended waits for its last answers.
+    """
+
+    def __init__(self, config, model, workers=2, backend="tensorrt", classes=None,
+                 detector_options=None, tracker_options=None, msg_queue=None,
+                 batch_size=None, max_wait=0.02, ring_slots=8,
+                 max_frame_shape=(1080, 1920, 3), slot_timeout=5.0, max_restarts=5):
+        from multi_stream import DEFAULT_TRACKER
+        self.ctx = mp.get_context("spawn")
+        streams = config["streams"]
+        self.workers = min(workers, len(streams))
+        self.shards = [streams[i::self.workers] for i in range(self.workers)]
+        self.model = model
+        self.backend = backend
+        self.detector_kwargs = dict(detector_options or {}, classes=classes)
+        self.tracker_options = {**DEFAULT_TRACKER, **config.get("tracker", {}),
+                                **(tracker_options or {})}
+        self.msg_queue = msg_queue
+        self.batch_size = batch_size or config.get("batch_size", 1)
+        self.max_wait = max_wait
+        self.ring_slots = ring_slots
+        self.max_frame_shape = max_frame_shape
+        self.slot_timeout = slot_timeout
+        self.max_restarts = max_restarts
+
+        self.rings = list()
+        self.stop_event = self.ctx.Event()
+        self.inference = None
+        self.inference_channel = None
+        self.processes = [None] * self.workers
+        self.channels = [None] * self.workers
+        self.generations = [0] * self.workers
+        # (worker, generation, token) -> request, for the requests sent to
+        # the current inference process and not answered yet
+        self.in_flight = dict()
+        self._routing = threading.Lock()
+        self.restarts = [0] * (self.workers + 1)  # last one: inference
+        self.done = [False] * self.workers
+
+    def _pump(self, channel, handle):
+        """Hand everything arriving on `channel.outbox` to `handle`"""
+        def pump():
+            while not channel.closed.is_set():
+                try:
+                    message = channel.outbox.get(timeout=0.5)
+                except Empty:
+                    continue
+                handle(message)
+        threading.Thread(target=pump, daemon=True).start()
+
+    def _from_worker(self, message):
+        kind, payload = message
+        if kind == "event":
+            if self.msg_queue is not None:
+                self.msg_queue.put(payload)
+        else:
+            worker, generation, _, _, token = payload[:5]
+            with self._routing:
+                self.in_flight[(worker, generation, token)] = payload
+                self.inference_channel.inbox.put(payload)
+
+    def _answer(self, request, detection):
+        worker, generation, stream, slot, token, shape, source_shape, captured = request
+        if generation == self.generations[worker]:  # else its worker crashed
+            self.channels[worker].inbox.put((stream, slot, token, shape, source_shape,
+                                             captured, detection))
+
+    def _from_inference(self, message):
+        request, detection = message[:-1], message[-1]
+        worker, generation, _, _, token = request[:5]
+        with self._routing:
+            if self.in_flight.pop((worker, generation, token), None) is None:
+                return  # Already answered as lost
+        self._answer(request, detection)
+
+    def _start_inference(self):
+        with self._routing:
+            if self.inference_channel is not None:
+                self.inference_channel.closed.set()
+            channel = self.inference_channel = Channel(self.ctx)
+            lost, self.in_flight = self.in_flight, dict()
+        # Whatever the previous process had queued or was running is gone
+        # with it and its channel
+        for request in lost.values():
+            self._answer(request, None)
+        self.inference = self.ctx.Process(
+            target=inference_worker, name="inference", daemon=True,
+            args=(self.model, self.backend, self.detector_kwargs, self.batch_size,
+                  self.max_wait, channel.inbox, channel.outbox,
+                  [ring.spec for ring in self.rings]))
+        self.inference.start()
+        self._pump(channel, self._from_inference)
+
+    def _start_worker(self, index):
+        if self.channels[index] is not None:
+            self.channels[index].closed.set()
+        channel = self.channels[index] = Channel(self.ctx)
+        self.generations[index] += 1
+        self.processes[index] = self.ctx.Process(
+            target=camera_worker, name=f"camera-{index}", daemon=True,
+            args=(index, self.generations[index], self.shards[index],
+                  self.tracker_options, self.rings[index].spec, channel.outbox,
+                  channel.inbox, self.stop_event, self.slot_timeout))
+        self.processes[index].start()
+        self._pump(channel, self._from_worker)
+
+    def start(self):
+        self.rings = [FrameRing(self.ring_slots, self.max_frame_shape)
+                      for _ in range(self.workers)]
+        self._start_inference()
+        for index in range(self.workers):
+            self._start_worker(index)
+
+    def _restart(self, index, name, start):
+        if self.restarts[index] >= self.max_restarts:
+            logger.error(f"{name} crashed {self.restarts[index]} times, giving up")
+            return False
+        self.restarts[index] += 1
+        logger.warning(f"{name} crashed, restarting ({self.restarts[index]}/{self.max_restarts})")
+        start()
+        return True
+
+    def _check(self):
+        """Restart crashed processes; False once there is nothing left to run"""
+        if not self.inference.is_alive():
+            if not self._restart(self.workers, "inference", self._start_inference):
+                self.stop()
+                return False
+        for index, process in enumerate(self.processes):
+            if self.done[index] or process.is_alive():
+                continue
+            if process.exitcode == 0 or self.stop_event.is_set():
+                self.done[index] = True
+            elif not self._restart(index, process.name,
+                                   lambda: self._start_worker(index)):
+                self.done[index] = True
+        return not all(self.done)
+
+    def run(self):
+        self.start()
+        try:
+            while self._check():
+                time.sleep(0.5)
+        finally:
+            self.shutdown()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def shutdown(self):
+        self.stop_event.set()
+        for process in self.processes:
+            if process is not None:
+                process.join(timeout=5)
+        if self.inference is not None and self.inference.is_alive():
+            self.inference_channel.inbox.put(None)
+            self.inference.join(timeout=5)
+        # Let the pumps drain the last events before closing the channels
+        time.sleep(0.5)
+        for channel in self.channels + [self.inference_channel]:
+            if channel is not None:
+                channel.closed.set()
+        for ring in self.rings:
+            ring.close()
+            ring.unlink()
+        self.rings = list()
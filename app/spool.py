@@ -0,0 +1,238 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = ".log"
+
+
+class EventSpool(object):
+    """
+    Append-only on-disk event log, so events survive broker outages and
+    restarts.
+
+    Every event gets the next sequence number and the spool's id, and is
+    appended as one JSON line to the active segment in `directory`;
+    segments are named after their first sequence number and rotate at
+    `segment_bytes`. Appends reach the OS immediately, `sync` makes them
+    durable (fsync) and is meant to be called every so often, not per
+    event. The sender acks sequence numbers as the broker confirms them;
+    the contiguous acked watermark is persisted by `sync`, so after a
+    restart delivery resumes after the last acked event. Events sent but
+    not yet acked are sent again, and consumers drop the duplicates by
+    (spool, seq).
+
+    Fully acked segments are deleted. Beyond `max_bytes` on disk, or
+    `retention_seconds` of age, the oldest segments are deleted even if
+    unacked; such `evicted` events are lost and logged.
+    """
+
+    def __init__(self, directory, segment_bytes=4 * 1024 * 1024, max_bytes=256 * 1024 * 1024,
+                 retention_seconds=None):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.retention_seconds = retention_seconds
+        self.evicted = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.id = self._spool_id()
+        self.segments = self._segments()  # first seq of each segment, oldest first
+        self.next_seq = self._recover()
+        self.acked = self._read_ack()
+        self._acked_above = set()  # acked sequence numbers past the watermark
+        self._synced_ack = self.acked
+        self._active = None
+        self._active_size = 0
+        self._reader = None  # (next seq, first seq of its segment, open file)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _segment_path(self, first_seq):
+        return self._path(f"{first_seq:020d}{SEGMENT_SUFFIX}")
+
+    def _spool_id(self):
+        path = self._path("id")
+        if not os.path.exists(path):
+            self._write_atomic(path, uuid.uuid4().hex)
+        with open(path) as f:
+            return f.read().strip()
+
+    def _segments(self):
+        return sorted(int(name[:-len(SEGMENT_SUFFIX)]) for name in os.listdir(self.directory)
+                      if name.endswith(SEGMENT_SUFFIX))
+
+    def _recover(self):
+        """Next sequence number, dropping a record torn by a crash mid-append"""
+        if not self.segments:
+            return 1
+        path = self._segment_path(self.segments[-1])
+        next_seq, valid = self.segments[-1], 0
+        with open(path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    next_seq = json.loads(line)["seq"] + 1
+                except ValueError:
+                    break
+                valid += len(line)
+        if valid < os.path.getsize(path):
+            logger.warning(f"Spool {path}: dropping a torn record")
+            with open(path, "r+b") as f:
+                f.truncate(valid)
+        return next_seq
+
+    def _read_ack(self):
+        first = self.segments[0] if self.segments else self.next_seq
+        try:
+            with open(self._path("acked")) as f:
+                acked = int(f.read())
+        except (OSError, ValueError):
+            acked = 0
+        return max(acked, first - 1)
+
+    def _write_atomic(self, path, text):
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def append(self, event):
+        """Log `event` and return the record to publish, with its seq"""
+        with self._lock:
+            if self._active is None or self._active_size >= self.segment_bytes:
+                self._rotate()
+            record = {"spool": self.id, "seq": self.next_seq, **event}
+            line = (json.dumps(record) + "\n").encode("utf-8")
+            self._active.write(line)
+            self._active.flush()
+            self._active_size += len(line)
+            self.next_seq += 1
+            return record
+
+    def _rotate(self):
+        if self._active is not None:
+            os.fsync(self._active.fileno())
+            self._active.close()
+        if not self.segments or self.segments[-1] != self.next_seq:
+            self.segments.append(self.next_seq)
+        path = self._segment_path(self.segments[-1])
+        self._active = open(path, "ab")
+        self._active_size = self._active.tell()
+
+    def read(self, seq, limit):
+        """Up to `limit` records from `seq` on (or the oldest one kept)"""
+        with self._lock:
+            if not self.segments:
+                return []
+            seq = max(seq, self.segments[0])
+            if self._reader is None or self._reader[0] != seq:
+                self._seek(seq)
+            records = list()
+            while len(records) < limit and self._reader[0] < self.next_seq:
+                next_seq, first, f = self._reader
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    # End of this segment: move to the next one
+                    later = [s for s in self.segments if s > first]
+                    if not later:
+                        f.seek(-len(line), os.SEEK_CUR)
+                        break
+                    f.close()
+                    self._reader = (next_seq, later[0], open(self._segment_path(later[0]), "rb"))
+                    continue
+                record = json.loads(line)
+                self._reader = (record["seq"] + 1, first, f)
+                records.append(record)
+            return records
+
+    def _seek(self, seq):
+        if self._reader is not None:
+            self._reader[2].close()
+        first = max(s for s in self.segments if s <= seq)
+        f = open(self._segment_path(first), "rb")
+        next_seq = first
+        while next_seq < seq:
+            line = f.readline()
+            if not line.endswith(b"\n"):
+                f.seek(-len(line), os.SEEK_CUR)
+                break
+            next_seq = json.loads(line)["seq"] + 1
+        self._reader = (next_seq, first, f)
+
+    def ack(self, seq):
+        """Mark `seq` delivered"""
+        with self._lock:
+            if seq <= self.acked:
+                return
+            self._acked_above.add(seq)
+            while self.acked + 1 in self._acked_above:
+                self.acked += 1
+                self._acked_above.remove(self.acked)
+
+    def backlog(self):
+        return self.next_seq - 1 - self.acked
+
+    def sync(self):
+        """fsync appended events, persist the acked watermark and apply retention"""
+        with self._lock:
+            if self._active is not None:
+                os.fsync(self._active.fileno())
+            if self.acked != self._synced_ack:
+                self._write_atomic(self._path("acked"), str(self.acked))
+                self._synced_ack = self.acked
+            self._retain()
+
+    def _retain(self):
+        now = time.time()
+        while len(self.segments) > 1:
+            first, following = self.segments[0], self.segments[1]
+            path = self._segment_path(first)
+            if following - 1 <= self.acked:
+                reason = None
+            elif sum(os.path.getsize(self._segment_path(s)) for s in self.segments) > self.max_bytes:
+                reason = "disk limit"
+            elif (self.retention_seconds is not None
+                  and now - os.path.getmtime(path) > self.retention_seconds):
+                reason = "retention"
+            else:
+                break
+            if reason is not None:
+                lost = following - 1 - self.acked
+                self.evicted += lost
+                logger.warning(f"Spool: evicting {lost} undelivered events ({reason})")
+                self.acked = following - 1
+                self._acked_above = {s for s in self._acked_above if s > self.acked}
+            if self._reader is not None and self._reader[1] == first:
+                self._reader[2].close()
+                self._reader = None
+            os.remove(path)
+            self.segments.pop(0)
+
+    def close(self):
+        self.sync()
+        with self._lock:
+            if self._active is not None:
+                self._active.close()
+                self._active = None
+            if self._reader is not None:
+                self._reader[2].close()
+                self._reader = None
+
+    def stats(self):
+        with self._lock:
+            return {"segments": len(self.segments),
+                    "bytes": sum(os.path.getsize(self._segment_path(s)) for s in self.segments),
+                    "next_seq": self.next_seq,
+                    "acked": self.acked,
+                    "backlog": self.next_seq - 1 - self.acked,
+                    "evicted": self.evicted}
@@ -0,0 +1,98 @@
+import math
+import threading
+
+import numpy as np
+
+
+def distance_to_segment(points, segment):
+    """Euclidean distance of (N, 2) `points` to the segment ((x1, y1), (x2, y2))."""
+    (x1, y1), (x2, y2) = segment
+    start = np.array([x1, y1], dtype=np.float64)
+    direction = np.array([x2 - x1, y2 - y1], dtype=np.float64)
+    length2 = max(direction @ direction, 1e-12)
+    t = np.clip((points - start) @ direction / length2, 0.0, 1.0)
+    return np.linalg.norm(points - (start + t[:, None] * direction), axis=1)
+
+
+class AdaptiveStride(object):
+    """
+    Detection stride controller: the detector runs on one frame in `stride`,
+    and the tracker coasts on Kalman prediction in between.
+
+    The stride follows scene activity: with no tracks it rises to
+    `max_stride`; otherwise it is the number of frames the closest track
+    needs to reach the counting line at its current speed, divided by
+    `safety`, so detection is back to every frame before anything can
+    cross. Tracks seen for the first time are assumed to move at
+    `new_track_speed` pixels per frame, and while the last detected frame
+    had more boxes than confirmed tracks the stride stays at `min_stride`:
+    a new track is only confirmed by a second detection close enough to
+    the first one. The measured detector time sets a
+    floor: if detection takes longer than `stride` frame intervals the
+    stride grows to keep up with the stream.
+    """
+
+    def __init__(self, line, min_stride=1, max_stride=5, fps=30, safety=2.0,
+                 new_track_speed=20.0, smoothing=0.2):
+        self.line = line
+        self.min_stride = min_stride
+        self.max_stride = max_stride
+        self.frame_interval = 1.0 / fps
+        self.safety = safety
+        self.new_track_speed = new_track_speed
+        self.smoothing = smoothing
+        self.stride = min_stride
+        self.detect_time = None  # EMA of detector seconds per frame
+        self.frames = 0
+        self.detected = 0
+        self._countdown = 0
+        self._unconfirmed = False
+        self._centers = dict()  # object_id -> center at the last frame seen
+        self._lock = threading.Lock()
+
+    def due(self):
+        """Whether the next frame should go through the detector"""
+        with self._lock:
+            self.frames += 1
+            if self._countdown > 0:
+                self._countdown -= 1
+                return False
+            self._countdown = self.stride - 1
+            self.detected += 1
+            return True
+
+    def observe_load(self, seconds_per_frame):
+        if self.detect_time is None:
+            self.detect_time = seconds_per_frame
+        else:
+            self.detect_time += self.smoothing * (seconds_per_frame - self.detect_time)
+
+    def observe(self, tracked_objects, detections=None):
+        """Re-derive the stride from the tracks of the latest frame and, when
+        it went through the detector, its number of `detections`"""
+        if detections is not None:
+            self._unconfirmed = detections > len(tracked_objects)
+        stride = self.max_stride
+        if self._unconfirmed:
+            stride = self.min_stride
+        if tracked_objects:
+            ids = [obj["object_id"] for obj in tracked_objects]
+            boxes = np.array([obj["bbox"] for obj in tracked_objects], dtype=np.float64)
+            centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+            speeds = np.array([np.linalg.norm(center - self._centers[i])
+                               if i in self._centers else self.new_track_speed
+                               for i, center in zip(ids, centers)])
+            frames_to_line = distance_to_segment(centers, self.line) / np.maximum(speeds, 1e-6)
+            stride = min(stride, int(frames_to_line.min() / self.safety))
+            self._centers = dict(zip(ids, centers))
+        else:
+            self._centers = dict()
+
+        stride = min(max(stride, self.min_stride), self.max_stride)
+        if self.detect_time is not None:
+            load_stride = math.ceil(self.detect_time / self.frame_interval)
+            stride = max(stride, min(load_stride, self.max_stride))
+        self.stride = stride
+
+    def skip_ratio(self):
+        return 1.0 - self.detected / max(self.frames, 1)
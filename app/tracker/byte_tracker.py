@@ -1,5 +1,5 @@
 import numpy as np
-from collections import deque
+from collections import deque, OrderedDict
 import os
 import os.path as osp
 import copy
@@ -9,18 +9,38 @@ import torch.nn.functional as F
 from .kalman_filter import KalmanFilter
 from tracker import matching
 from .basetrack import BaseTrack, TrackState
+from .track_store import TrackStore, StoreField
 
 class STrack(BaseTrack):
     shared_kalman = KalmanFilter()
-    def __init__(self, tlwh, score):
+
+    # Backed by the owning TrackStore while the track is live.
+    mean = StoreField()
+    covariance = StoreField()
+    state = StoreField()
+    track_id = StoreField()
+    score = StoreField()
+    obj_class = StoreField()
+    frame_id = StoreField()
+    start_frame = StoreField()
+    tracklet_len = StoreField()
+    is_activated = StoreField()
+
+    def __init__(self, tlwh, score, obj_class=-1):
+        self._store, self._slot = None, None
 
         # wait activate
         self._tlwh = np.asarray(tlwh, dtype=np.float64)
         self.kalman_filter = None
         self.mean, self.covariance = None, None
+        self.state = TrackState.New
+        self.track_id = 0
+        self.frame_id = 0
+        self.start_frame = 0
         self.is_activated = False
 
         self.score = score
+        self.obj_class = obj_class
         self.tracklet_len = 0
 
     def predict(self):
@@ -31,18 +51,39 @@ class STrack(BaseTrack):
 
     @staticmethod
     def multi_predict(stracks):
-        if len(stracks) > 0:
-            multi_mean = np.asarray([st.mean.copy() for st in stracks])
-            multi_covariance = np.asarray([st.covariance for st in stracks])
-            for i, st in enumerate(stracks):
-                if st.state != TrackState.Tracked:
-                    multi_mean[i][7] = 0
-            multi_mean, multi_covariance = STrack.shared_kalman.multi_predict(multi_mean, multi_covariance)
-            for i, (mean, cov) in enumerate(zip(multi_mean, multi_covariance)):
-                stracks[i].mean = mean
-                stracks[i].covariance = cov
-
-    def activate(self, kalman_filter, frame_id):
+        if len(stracks) == 0:
+            return
+        store = stracks[0]._store
+        if store is not None:
+            store.predict(track_slots(stracks), STrack.shared_kalman)
+            return
+        multi_mean = np.asarray([st.mean.copy() for st in stracks])
+        multi_covariance = np.asarray([st.covariance for st in stracks])
+        for i, st in enumerate(stracks):
+            if st.state != TrackState.Tracked:
+                multi_mean[i][7] = 0
+        multi_mean, multi_covariance = STrack.shared_kalman.multi_predict(multi_mean, multi_covariance)
+        for i, (mean, cov) in enumerate(zip(multi_mean, multi_covariance)):
+            stracks[i].mean = mean
+            stracks[i].covariance = cov
+
+    def _attach(self, store):
+        """Move this track's state into a slot of `store`."""
+        values = {name: self.__dict__.pop(name) for name, _, _ in store._fields}
+        self._store, self._slot = store, store.allocate()
+        for name, value in values.items():
+            setattr(self, name, value)
+
+    def _detach(self):
+        """Copy this track's state out of its store and free the slot."""
+        store, slot = self._store, self._slot
+        values = {name: getattr(self, name) for name, _, _ in store._fields}
+        self._slot = None
+        for name, value in values.items():
+            self.__dict__[name] = value.copy() if isinstance(value, np.ndarray) else value
+        store.release(slot)
+
+    def activate(self, kalman_filter, frame_id, store=None):
         """Start a new tracklet"""
         self.kalman_filter = kalman_filter
         self.track_id = self.next_id()
@@ -55,6 +96,8 @@ class STrack(BaseTrack):
         # self.is_activated = True
         self.frame_id = frame_id
         self.start_frame = frame_id
+        if store is not None:
+            self._attach(store)
 
     def re_activate(self, new_track, frame_id, new_id=False):
         self.mean, self.covariance = self.kalman_filter.update(
@@ -67,6 +110,7 @@ class STrack(BaseTrack):
         if new_id:
             self.track_id = self.next_id()
         self.score = new_track.score
+        self.obj_class = new_track.obj_class
 
     def update(self, new_track, frame_id):
         """
@@ -86,6 +130,7 @@ class STrack(BaseTrack):
         self.is_activated = True
 
         self.score = new_track.score
+        self.obj_class = new_track.obj_class
 
     @property
     # @jit(nopython=True)
@@ -117,8 +162,8 @@ class STrack(BaseTrack):
         height)`, where the aspect ratio is `width / height`.
         """
         ret = np.asarray(tlwh).copy()
-        ret[:2] += ret[2:] / 2
-        ret[2] /= ret[3]
+        ret[..., :2] += ret[..., 2:] / 2
+        ret[..., 2] /= ret[..., 3]
         return ret
 
     def to_xyah(self):
@@ -128,14 +173,14 @@ class STrack(BaseTrack):
     # @jit(nopython=True)
     def tlbr_to_tlwh(tlbr):
         ret = np.asarray(tlbr).copy()
-        ret[2:] -= ret[:2]
+        ret[..., 2:] -= ret[..., :2]
         return ret
 
     @staticmethod
     # @jit(nopython=True)
     def tlwh_to_tlbr(tlwh):
         ret = np.asarray(tlwh).copy()
-        ret[2:] += ret[:2]
+        ret[..., 2:] += ret[..., :2]
         return ret
 
     def __repr__(self):
@@ -144,9 +189,14 @@ class STrack(BaseTrack):
 
 class BYTETracker(object):
     def __init__(self, args, frame_rate=30):
-        self.tracked_stracks = []  # type: list[STrack]
-        self.lost_stracks = []  # type: list[STrack]
-        self.removed_stracks = []  # type: list[STrack]
+        # Live tracks by track id, in the order they joined.
+        self.tracked_stracks = {}  # type: dict[int, STrack]
+        self.lost_stracks = {}  # type: dict[int, STrack]
+        # Frame each recently removed track id was removed in, oldest first;
+        # kept for `removed_retention` frames only.
+        self.removed_stracks = OrderedDict()  # type: OrderedDict[int, int]
+        # Ids of tracks removed since the last pop_removed_ids()
+        self.removed_ids = []
 
         self.frame_id = 0
         self.args = args
@@ -154,25 +204,39 @@ class BYTETracker(object):
         self.det_thresh = args.track_thresh + 0.1
         self.buffer_size = int(frame_rate / 30.0 * args.track_buffer)
         self.max_time_lost = self.buffer_size
+        self.removed_retention = max(1, getattr(args, 'removed_retention', self.max_time_lost))
+        # Frames a track is still reported on Kalman prediction alone after
+        # its last matched detection, see advance().
+        self.max_coast = getattr(args, 'max_coast', 10)
         self.kalman_filter = KalmanFilter()
-
-    def update(self, output_results, img_info, img_size):
+        self.track_store = TrackStore()
+        # Grid-gated sparse association for dense scenes.
+        self.gated = getattr(args, 'gated', False)
+
+    def update(self, output_results, img_info, img_size, classes=None):
+        """Associate one frame's detections with the tracks; `classes`, one
+        class id per detection row, is carried onto the tracks they match
+        (-1 when not given)."""
         self.frame_id += 1
         activated_starcks = []
         refind_stracks = []
         lost_stracks = []
         removed_stracks = []
+        prev_stracks = list(self.tracked_stracks.values()) + list(self.lost_stracks.values())
 
+        if not isinstance(output_results, np.ndarray):
+            # torch tensors: everything below works on packed NumPy arrays
+            output_results = output_results.cpu().numpy()
         if output_results.shape[1] == 5:
             scores = output_results[:, 4]
             bboxes = output_results[:, :4]
         else:
-            output_results = output_results.cpu().numpy()
             scores = output_results[:, 4] * output_results[:, 5]
             bboxes = output_results[:, :4]  # x1y1x2y2
         img_h, img_w = img_info[0], img_info[1]
         scale = min(img_size[0] / float(img_h), img_size[1] / float(img_w))
         bboxes /= scale
+        classes = np.full(len(scores), -1) if classes is None else np.asarray(classes)
 
         remain_inds = scores > self.args.track_thresh
         inds_low = scores > 0.1
@@ -183,62 +247,46 @@ class BYTETracker(object):
         dets = bboxes[remain_inds]
         scores_keep = scores[remain_inds]
         scores_second = scores[inds_second]
+        classes_keep = classes[remain_inds]
+        classes_second = classes[inds_second]
 
         if len(dets) > 0:
             '''Detections'''
-            detections = [STrack(STrack.tlbr_to_tlwh(tlbr), s) for
-                          (tlbr, s) in zip(dets, scores_keep)]
+            detections = [STrack(STrack.tlbr_to_tlwh(tlbr), s, c) for
+                          (tlbr, s, c) in zip(dets, scores_keep, classes_keep)]
         else:
             detections = []
+        det_tlwh = STrack.tlbr_to_tlwh(dets)
+        det_tlbr, det_xyah = STrack.tlwh_to_tlbr(det_tlwh), STrack.tlwh_to_xyah(det_tlwh)
 
         ''' Add newly detected tracklets to tracked_stracks'''
         unconfirmed = []
-        tracked_stracks = []  # type: list[STrack]
-        for track in self.tracked_stracks:
+        tracked_stracks = {}  # type: dict[int, STrack]
+        for track_id, track in self.tracked_stracks.items():
             if not track.is_activated:
                 unconfirmed.append(track)
             else:
-                tracked_stracks.append(track)
+                tracked_stracks[track_id] = track
 
         ''' Step 2: First association, with high score detection boxes'''
-        strack_pool = joint_stracks(tracked_stracks, self.lost_stracks)
+        strack_pool = list(joint_stracks(tracked_stracks, self.lost_stracks).values())
         # Predict the current location with KF
-        STrack.multi_predict(strack_pool)
-        dists = matching.iou_distance(strack_pool, detections)
-        if not self.args.mot20:
-            dists = matching.fuse_score(dists, detections)
-        matches, u_track, u_detection = matching.linear_assignment(dists, thresh=self.args.match_thresh)
-
-        for itracked, idet in matches:
-            track = strack_pool[itracked]
-            det = detections[idet]
-            if track.state == TrackState.Tracked:
-                track.update(detections[idet], self.frame_id)
-                activated_starcks.append(track)
-            else:
-                track.re_activate(det, self.frame_id, new_id=False)
-                refind_stracks.append(track)
+        self.track_store.predict(track_slots(strack_pool), self.kalman_filter)
+        matches, u_track, u_detection = self._associate(
+            stracks_tlbr(strack_pool), det_tlbr, self.args.match_thresh,
+            None if self.args.mot20 else scores_keep)
+        self._update_matched(strack_pool, matches, det_xyah, scores_keep, classes_keep,
+                             activated_starcks, refind_stracks)
 
         ''' Step 3: Second association, with low score detection boxes'''
         # association the untrack to the low score detections
-        if len(dets_second) > 0:
-            '''Detections'''
-            detections_second = [STrack(STrack.tlbr_to_tlwh(tlbr), s) for
-                          (tlbr, s) in zip(dets_second, scores_second)]
-        else:
-            detections_second = []
         r_tracked_stracks = [strack_pool[i] for i in u_track if strack_pool[i].state == TrackState.Tracked]
-        dists = matching.iou_distance(r_tracked_stracks, detections_second)
-        matches, u_track, u_detection_second = matching.linear_assignment(dists, thresh=0.5)
-        for itracked, idet in matches:
-            track = r_tracked_stracks[itracked]
-            det = detections_second[idet]
-            if track.state == TrackState.Tracked:
-                track.update(det, self.frame_id)
-                activated_starcks.append(track)
-            else:
-                track.re_activate(det, self.frame_id, new_id=False)
-                refind_stracks.append(track)
+        det_second_tlwh = STrack.tlbr_to_tlwh(dets_second)
+        matches, u_track, u_detection_second = self._associate(
+            stracks_tlbr(r_tracked_stracks), STrack.tlwh_to_tlbr(det_second_tlwh), 0.5)
+        det_second_xyah = STrack.tlwh_to_xyah(det_second_tlwh)
+        self._update_matched(r_tracked_stracks, matches, det_second_xyah, scores_second,
+                             classes_second, activated_starcks, refind_stracks)
 
         for it in u_track:
             track = r_tracked_stracks[it]
@@ -248,13 +296,14 @@ class BYTETracker(object):
 
         '''Deal with unconfirmed tracks, usually tracks with only one beginning frame'''
         detections = [detections[i] for i in u_detection]
-        dists = matching.iou_distance(unconfirmed, detections)
-        if not self.args.mot20:
-            dists = matching.fuse_score(dists, detections)
-        matches, u_unconfirmed, u_detection = matching.linear_assignment(dists, thresh=0.7)
-        for itracked, idet in matches:
-            unconfirmed[itracked].update(detections[idet], self.frame_id)
-            activated_starcks.append(unconfirmed[itracked])
+        u_detection = np.asarray(u_detection, dtype=int)
+        det_tlbr, det_xyah = det_tlbr[u_detection], det_xyah[u_detection]
+        scores_keep, classes_keep = scores_keep[u_detection], classes_keep[u_detection]
+        matches, u_unconfirmed, u_detection = self._associate(
+            stracks_tlbr(unconfirmed), det_tlbr, 0.7,
+            None if self.args.mot20 else scores_keep)
+        self._update_matched(unconfirmed, matches, det_xyah, scores_keep, classes_keep,
+                             activated_starcks, refind_stracks)
         for it in u_unconfirmed:
             track = unconfirmed[it]
             track.mark_removed()
@@ -265,66 +314,142 @@ class BYTETracker(object):
             track = detections[inew]
             if track.score < self.det_thresh:
                 continue
-            track.activate(self.kalman_filter, self.frame_id)
+            track.activate(self.kalman_filter, self.frame_id, self.track_store)
             activated_starcks.append(track)
         """ Step 5: Update state"""
-        for track in self.lost_stracks:
-            if self.frame_id - track.end_frame > self.max_time_lost:
-                track.mark_removed()
-                removed_stracks.append(track)
+        prev_lost = list(self.lost_stracks.values())
+        expired = self.frame_id - self.track_store.frame_id[track_slots(prev_lost)] > self.max_time_lost
+        for i in np.flatnonzero(expired):
+            track = prev_lost[i]
+            track.mark_removed()
+            removed_stracks.append(track)
 
         # print('Ramained match {} s'.format(t4-t3))
 
-        self.tracked_stracks = [t for t in self.tracked_stracks if t.state == TrackState.Tracked]
-        self.tracked_stracks = joint_stracks(self.tracked_stracks, activated_starcks)
-        self.tracked_stracks = joint_stracks(self.tracked_stracks, refind_stracks)
+        self.tracked_stracks = {tid: t for tid, t in self.tracked_stracks.items()
+                                if t.state == TrackState.Tracked}
+        self.tracked_stracks = joint_stracks(self.tracked_stracks, by_id(activated_starcks))
+        self.tracked_stracks = joint_stracks(self.tracked_stracks, by_id(refind_stracks))
         self.lost_stracks = sub_stracks(self.lost_stracks, self.tracked_stracks)
-        self.lost_stracks.extend(lost_stracks)
+        self.lost_stracks.update(by_id(lost_stracks))
         self.lost_stracks = sub_stracks(self.lost_stracks, self.removed_stracks)
-        self.removed_stracks.extend(removed_stracks)
+        self._retire(removed_stracks)
         self.tracked_stracks, self.lost_stracks = remove_duplicate_stracks(self.tracked_stracks, self.lost_stracks)
+        # Free the store slots of every track that left both live lists;
+        # those not removed above (e.g. dropped as duplicates) are removed
+        # now, so their ids reach pop_removed_ids() too.
+        live = set(map(id, self.tracked_stracks.values())) | set(map(id, self.lost_stracks.values()))
+        discarded = []
+        for track in prev_stracks + activated_starcks:
+            if track._slot is not None and id(track) not in live:
+                if track.state != TrackState.Removed:
+                    track.mark_removed()
+                    discarded.append(track)
+                track._detach()
+        self._retire(discarded)
         # get scores of lost tracks
-        output_stracks = [track for track in self.tracked_stracks if track.is_activated]
+        output_stracks = [track for track in self.tracked_stracks.values() if track.is_activated]
 
         return output_stracks
 
+    def advance(self):
+        """Move every track to the next frame on Kalman prediction alone, for
+        frames that skip detection; returns the activated tracked tracks
+        matched to a detection within the last `max_coast` frames, so a
+        track whose object has gone is not extrapolated for long."""
+        self.frame_id += 1
+        strack_pool = list(joint_stracks(self.tracked_stracks, self.lost_stracks).values())
+        self.track_store.predict(track_slots(strack_pool), self.kalman_filter)
+        return [track for track in self.tracked_stracks.values()
+                if track.is_activated and self.frame_id - track.frame_id <= self.max_coast]
+
+    def _retire(self, removed_stracks):
+        """Record this frame's removed tracks and forget the ones removed more
+        than `removed_retention` frames ago."""
+        for track in removed_stracks:
+            self.removed_stracks[track.track_id] = self.frame_id
+            self.removed_ids.append(track.track_id)
+        horizon = self.frame_id - self.removed_retention
+        while self.removed_stracks and next(iter(self.removed_stracks.values())) < horizon:
+            self.removed_stracks.popitem(last=False)
+
+    def pop_removed_ids(self):
+        """Ids of the tracks removed since the previous call, e.g. to drop
+        per-track state kept elsewhere"""
+        removed_ids, self.removed_ids = self.removed_ids, []
+        return removed_ids
+
+    def _associate(self, tracks_tlbr, dets_tlbr, thresh, det_scores=None):
+        """IoU association of packed track and detection boxes, optionally
+        fused with the detection scores."""
+        if self.gated:
+            return matching.gated_linear_assignment(tracks_tlbr, dets_tlbr, thresh, det_scores)
+        dists = matching.iou_distance(tracks_tlbr, dets_tlbr)
+        if det_scores is not None:
+            dists = matching.fuse_score(dists, det_scores)
+        return matching.linear_assignment(dists, thresh=thresh)
+
+    def _update_matched(self, tracks, matches, det_xyah, det_scores, det_classes,
+                        activated_stracks, refind_stracks):
+        """Kalman-correct every matched track in one batched update and file
+        it as activated or re-found."""
+        matches = np.asarray(matches, dtype=int).reshape(-1, 2)
+        matched = [tracks[i] for i in matches[:, 0]]
+        reactivated = self.track_store.update(
+            track_slots(matched), det_xyah[matches[:, 1]], det_scores[matches[:, 1]],
+            det_classes[matches[:, 1]], self.frame_id, self.kalman_filter)
+        for track, refound in zip(matched, reactivated):
+            if refound:
+                refind_stracks.append(track)
+            else:
+                activated_stracks.append(track)
+
+
+def track_slots(stracks):
+    """Store slots of `stracks` as an index array."""
+    return np.fromiter((t._slot for t in stracks), dtype=np.intp, count=len(stracks))
+
+
+def stracks_tlbr(stracks):
+    """Boxes of live `stracks` as a packed (N, 4) tlbr array."""
+    if len(stracks) == 0:
+        return np.empty((0, 4))
+    return stracks[0]._store.tlbr(track_slots(stracks))
+
+
+def by_id(stracks):
+    """`stracks` keyed by track id."""
+    return {t.track_id: t for t in stracks}
+
 
 def joint_stracks(tlista, tlistb):
-    exists = {}
-    res = []
-    for t in tlista:
-        exists[t.track_id] = 1
-        res.append(t)
-    for t in tlistb:
-        tid = t.track_id
-        if not exists.get(tid, 0):
-            exists[tid] = 1
-            res.append(t)
+    """Tracks of `tlista` followed by those of `tlistb` not in it, both keyed
+    by track id."""
+    res = dict(tlista)
+    for tid, t in tlistb.items():
+        res.setdefault(tid, t)
     return res
 
 
 def sub_stracks(tlista, tlistb):
-    stracks = {}
-    for t in tlista:
-        stracks[t.track_id] = t
-    for t in tlistb:
-        tid = t.track_id
-        if stracks.get(tid, 0):
-            del stracks[tid]
-    return list(stracks.values())
+    """Tracks of `tlista` whose id is not a key of `tlistb`; costs
+    O(len(tlista)) however large `tlistb` is."""
+    return {tid: t for tid, t in tlista.items() if tid not in tlistb}
 
 
 def remove_duplicate_stracks(stracksa, stracksb):
-    pdist = matching.iou_distance(stracksa, stracksb)
+    """Drop the younger of every tracked/lost pair overlapping by IoU > 0.85."""
+    lista, listb = list(stracksa.values()), list(stracksb.values())
+    pdist = matching.iou_distance(stracks_tlbr(lista), stracks_tlbr(listb))
     pairs = np.where(pdist < 0.15)
-    dupa, dupb = list(), list()
+    dupa, dupb = set(), set()
     for p, q in zip(*pairs):
-        timep = stracksa[p].frame_id - stracksa[p].start_frame
-        timeq = stracksb[q].frame_id - stracksb[q].start_frame
+        timep = lista[p].frame_id - lista[p].start_frame
+        timeq = listb[q].frame_id - listb[q].start_frame
         if timep > timeq:
-            dupb.append(q)
+            dupb.add(q)
         else:
-            dupa.append(p)
-    resa = [t for i, t in enumerate(stracksa) if not i in dupa]
-    resb = [t for i, t in enumerate(stracksb) if not i in dupb]
+            dupa.add(p)
+    resa = {t.track_id: t for i, t in enumerate(lista) if i not in dupa}
+    resb = {t.track_id: t for i, t in enumerate(listb) if i not in dupb}
     return resa, resb
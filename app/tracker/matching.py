@@ -2,9 +2,10 @@ import cv2
 import numpy as np
 import scipy
 import lap
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
 from scipy.spatial.distance import cdist
 
-from cython_bbox import bbox_overlaps as bbox_ious
 from tracker import kalman_filter
 import time
 
@@ -50,36 +51,211 @@ def linear_assignment(cost_matrix, thresh):
     return matches, unmatched_a, unmatched_b
 
 
+def _grid_cells(tlbrs, cell_size, origin, ncols):
+    """
+    Enumerate the grid cells covered by every box.
+    :return: (owner, key) arrays with one entry per (box, cell)
+    """
+    c0 = np.floor((tlbrs[:, :2] - origin) / cell_size).astype(np.int64)
+    c1 = np.floor((tlbrs[:, 2:] - origin) / cell_size).astype(np.int64)
+    span = np.maximum(c1 - c0 + 1, 1)
+    counts = span[:, 0] * span[:, 1]
+    owner = np.repeat(np.arange(len(tlbrs)), counts)
+    local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    cx = c0[owner, 0] + local % span[owner, 0]
+    cy = c0[owner, 1] + local // span[owner, 0]
+    return owner, cy * ncols + cx
+
+
+def candidate_pairs(atlbrs, btlbrs, cell_size=None):
+    """
+    Index pairs of boxes that share at least one cell of a uniform grid.
+    Boxes that overlap always share a cell, so every pair with non-zero IoU
+    is returned; the work grows with the number of nearby pairs, not N*M.
+    :type atlbrs: np.ndarray (N, 4)
+    :type btlbrs: np.ndarray (M, 4)
+    :param cell_size: grid pitch in pixels, defaults to the median box size
+
+    :rtype (ia, ib) np.ndarray, np.ndarray
+    """
+    if len(atlbrs) == 0 or len(btlbrs) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    boxes = np.concatenate([atlbrs, btlbrs])
+    if cell_size is None:
+        cell_size = np.median(np.maximum(boxes[:, 2] - boxes[:, 0],
+                                         boxes[:, 3] - boxes[:, 1]))
+    cell_size = max(float(cell_size), 1.0)
+    origin = boxes[:, :2].min(axis=0)
+    ncols = int((boxes[:, 2].max() - origin[0]) // cell_size) + 2
+
+    a_owner, a_key = _grid_cells(atlbrs, cell_size, origin, ncols)
+    b_owner, b_key = _grid_cells(btlbrs, cell_size, origin, ncols)
+
+    # Join both cell lists on the cell key.
+    order = np.argsort(b_key, kind='stable')
+    b_owner, b_key = b_owner[order], b_key[order]
+    lo = np.searchsorted(b_key, a_key, side='left')
+    hi = np.searchsorted(b_key, a_key, side='right')
+    counts = hi - lo
+    ia = np.repeat(a_owner, counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    ib = b_owner[np.repeat(lo, counts) + offsets]
+
+    # Boxes spanning several cells meet more than once.
+    pair = np.unique(ia * len(btlbrs) + ib)
+    return pair // len(btlbrs), pair % len(btlbrs)
+
+
+def pair_ious(atlbrs, btlbrs, ia, ib):
+    """
+    IoU of the box pairs (atlbrs[ia], btlbrs[ib]) only, with the same
+    convention as `ious`.
+    :rtype ious np.ndarray
+    """
+    a, b = atlbrs[ia], btlbrs[ib]
+    iw = np.minimum(a[:, 2], b[:, 2]) - np.maximum(a[:, 0], b[:, 0]) + 1
+    ih = np.minimum(a[:, 3], b[:, 3]) - np.maximum(a[:, 1], b[:, 1]) + 1
+    inter = np.maximum(iw, 0) * np.maximum(ih, 0)
+    union = ((a[:, 2] - a[:, 0] + 1) * (a[:, 3] - a[:, 1] + 1) +
+             (b[:, 2] - b[:, 0] + 1) * (b[:, 3] - b[:, 1] + 1) - inter)
+    return np.divide(inter, union, out=np.zeros_like(inter), where=inter > 0)
+
+
+def gated_linear_assignment(atlbrs, btlbrs, thresh, det_scores=None, cell_size=None,
+                            block=256):
+    """
+    IoU association restricted to spatially overlapping boxes.
+
+    Equivalent to `linear_assignment(iou_distance(...), thresh)` (optionally
+    fused with `det_scores` as in `fuse_score`) for thresh < 1, since pairs
+    without overlap cost 1 and can never be matched. Candidate pairs come
+    from a uniform grid, and each connected component of the resulting
+    sparse bipartite graph is solved on its own, so the cost grows with the
+    number of real overlaps rather than N*M.
+    :type atlbrs: np.ndarray (N, 4)
+    :type btlbrs: np.ndarray (M, 4)
+
+    :rtype matches, unmatched_a, unmatched_b
+    """
+    atlbrs = np.asarray(atlbrs, dtype=np.float64).reshape(-1, 4)
+    btlbrs = np.asarray(btlbrs, dtype=np.float64).reshape(-1, 4)
+    n, m = len(atlbrs), len(btlbrs)
+
+    ia, ib = candidate_pairs(atlbrs, btlbrs, cell_size)
+    sim = pair_ious(atlbrs, btlbrs, ia, ib)
+    if det_scores is not None:
+        sim = sim * det_scores[ib]
+    cost = 1 - sim
+    keep = cost <= thresh
+    ia, ib, cost = ia[keep], ib[keep], cost[keep]
+
+    # Components of the bipartite graph; tracks are nodes [0, n), detections [n, n + m).
+    graph = coo_matrix((np.ones(len(ia)), (ia, ib + n)), shape=(n + m, n + m))
+    _, labels = connected_components(graph, directed=False)
+    comp = labels[ia]
+    rows = np.bincount(labels[:n], minlength=n + m)
+    cols = np.bincount(labels[n:], minlength=n + m)
+
+    # A component with a single track or a single detection (a star) is
+    # solved exactly by its cheapest edge.
+    star = (rows[comp] == 1) | (cols[comp] == 1)
+    order = np.flatnonzero(star)[np.lexsort((cost[star], comp[star]))]
+    cheapest = order[np.r_[True, np.diff(comp[order]) != 0]] if len(order) else order
+    matches = [np.stack([ia[cheapest], ib[cheapest]], axis=1)]
+
+    # The remaining components are laid out block-diagonally and solved in
+    # lapjv calls of about `block` rows each. Entries between components
+    # cost 1, so the blocks cannot interact and the solution is the same
+    # as solving each component separately.
+    general = np.unique(comp[~star])
+    if len(general) > 0:
+        gid = np.full(n + m, -1)
+        gid[general] = np.arange(len(general))
+        row_start = np.cumsum(rows[general]) - rows[general]
+        col_start = np.cumsum(cols[general]) - cols[general]
+
+        # Position of every track/detection in the block-diagonal layout.
+        row_nodes = np.flatnonzero(gid[labels[:n]] >= 0)
+        row_nodes = row_nodes[np.argsort(gid[labels[row_nodes]], kind='stable')]
+        col_nodes = np.flatnonzero(gid[labels[n:]] >= 0)
+        col_nodes = col_nodes[np.argsort(gid[labels[n + col_nodes]], kind='stable')]
+        row_pos = np.empty(n, dtype=np.int64)
+        row_pos[row_nodes] = np.arange(len(row_nodes))
+        col_pos = np.empty(m, dtype=np.int64)
+        col_pos[col_nodes] = np.arange(len(col_nodes))
+
+        edges = np.flatnonzero(~star)
+        chunk_of = row_start // block
+        edge_chunk = chunk_of[gid[comp[edges]]]
+        for chunk in np.unique(chunk_of):
+            in_chunk = chunk_of == chunk
+            r0, r1 = row_start[in_chunk][0], row_start[in_chunk][-1] + rows[general][in_chunk][-1]
+            c0, c1 = col_start[in_chunk][0], col_start[in_chunk][-1] + cols[general][in_chunk][-1]
+            e = edges[edge_chunk == chunk]
+            sub = np.ones((r1 - r0, c1 - c0))
+            sub[row_pos[ia[e]] - r0, col_pos[ib[e]] - c0] = cost[e]
+            sub_matches, _, _ = linear_assignment(sub, thresh)
+            if len(sub_matches) > 0:
+                matches.append(np.stack([row_nodes[sub_matches[:, 0] + r0],
+                                         col_nodes[sub_matches[:, 1] + c0]], axis=1))
+
+    matches = np.concatenate(matches).astype(int)
+    matches = matches[np.argsort(matches[:, 0], kind='stable')]
+    unmatched_a = np.setdiff1d(np.arange(n), matches[:, 0])
+    unmatched_b = np.setdiff1d(np.arange(m), matches[:, 1])
+    return matches, unmatched_a, unmatched_b
+
+
 def ious(atlbrs, btlbrs):
     """
-    Compute cost based on IoU
-    :type atlbrs: list[tlbr] | np.ndarray
+    Compute cost based on IoU, broadcasting every pair of boxes at once.
+    Box areas use the inclusive pixel convention (`x2 - x1 + 1`) of
+    cython_bbox, so costs are unchanged.
     :type atlbrs: list[tlbr] | np.ndarray
+    :type btlbrs: list[tlbr] | np.ndarray
 
     :rtype ious np.ndarray
     """
-    ious = np.zeros((len(atlbrs), len(btlbrs)), dtype=np.float64)
+    ious = np.empty((len(atlbrs), len(btlbrs)), dtype=np.float64)
     if ious.size == 0:
         return ious
 
-    ious = bbox_ious(
-        np.ascontiguousarray(atlbrs, dtype=np.float64),
-        np.ascontiguousarray(btlbrs, dtype=np.float64)
-    )
+    # Coordinates as contiguous rows so that broadcasting streams memory.
+    ax1, ay1, ax2, ay2 = np.ascontiguousarray(np.asarray(atlbrs, dtype=np.float64).T)
+    bx1, by1, bx2, by2 = np.ascontiguousarray(np.asarray(btlbrs, dtype=np.float64).T)
+    area_a = (ax2 - ax1 + 1) * (ay2 - ay1 + 1)
+    area_b = (bx2 - bx1 + 1) * (by2 - by1 + 1)
 
-    return ious
+    # Work in two (N, M) buffers with in-place ops to avoid temporaries.
+    inter = np.minimum(ax2[:, None], bx2, out=ious)
+    inter -= np.maximum(ax1[:, None], bx1)
+    inter += 1
+    np.maximum(inter, 0, out=inter)
+    ih = np.minimum(ay2[:, None], by2)
+    ih -= np.maximum(ay1[:, None], by1)
+    ih += 1
+    np.maximum(ih, 0, out=ih)
+    inter *= ih
+
+    union = np.add(area_a[:, None], area_b, out=ih)
+    union -= inter
+    return np.divide(inter, union, out=inter, where=inter > 0)
 
 
 def iou_distance(atracks, btracks):
     """
     Compute cost based on IoU
-    :type atracks: list[STrack]
-    :type btracks: list[STrack]
+    :type atracks: list[STrack] | np.ndarray
+    :type btracks: list[STrack] | np.ndarray
+
+    Packed (N, 4) tlbr arrays are used as-is, without going through the
+    per-track `tlbr` property.
 
     :rtype cost_matrix np.ndarray
     """
 
-    if (len(atracks)>0 and isinstance(atracks[0], np.ndarray)) or (len(btracks) > 0 and isinstance(btracks[0], np.ndarray)):
+    if isinstance(atracks, np.ndarray) or isinstance(btracks, np.ndarray) or \
+            (len(atracks)>0 and isinstance(atracks[0], np.ndarray)) or (len(btracks) > 0 and isinstance(btracks[0], np.ndarray)):
         atlbrs = atracks
         btlbrs = btracks
     else:
@@ -171,10 +347,16 @@ def fuse_iou(cost_matrix, tracks, detections):
 
 
 def fuse_score(cost_matrix, detections):
+    """
+    :param detections: list[STrack] | np.ndarray of detection scores
+    """
     if cost_matrix.size == 0:
         return cost_matrix
     iou_sim = 1 - cost_matrix
-    det_scores = np.array([det.score for det in detections])
+    if isinstance(detections, (list, tuple)):
+        det_scores = np.array([det.score for det in detections])
+    else:
+        det_scores = np.asarray(detections)
     det_scores = np.expand_dims(det_scores, axis=0).repeat(cost_matrix.shape[0], axis=0)
     fuse_sim = iou_sim * det_scores
     fuse_cost = 1 - fuse_sim
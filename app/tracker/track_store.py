@@ -0,0 +1,135 @@
+import numpy as np
+
+from .basetrack import TrackState
+
+
+class TrackStore(object):
+    """
+    Structure-of-arrays storage for the state of every live track.
+
+    Each activated track owns one row (slot) in a set of contiguous arrays
+    holding its Kalman mean/covariance and bookkeeping counters, so that
+    predict, update and pruning can run as batched array operations instead
+    of gathering and scattering per-track objects every frame. Slots of
+    removed tracks are recycled; the arrays grow geometrically when full.
+    """
+
+    _fields = (
+        ('mean', (8,), np.float64),
+        ('covariance', (8, 8), np.float64),
+        ('state', (), np.int8),
+        ('track_id', (), np.int64),
+        ('score', (), np.float64),
+        ('obj_class', (), np.int64),
+        ('frame_id', (), np.int64),
+        ('start_frame', (), np.int64),
+        ('tracklet_len', (), np.int64),
+        ('is_activated', (), np.bool_),
+    )
+
+    def __init__(self, capacity=256):
+        self.capacity = 0
+        for name, shape, dtype in self._fields:
+            setattr(self, name, np.zeros((0,) + shape, dtype=dtype))
+        self._free = []
+        self._grow(capacity)
+
+    def __len__(self):
+        return self.capacity - len(self._free)
+
+    def _grow(self, capacity):
+        for name, shape, dtype in self._fields:
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + shape, dtype=dtype)
+            new[:self.capacity] = old
+            setattr(self, name, new)
+        self.state[self.capacity:] = TrackState.Removed
+        # Hand out low slots first so live tracks stay packed at the front.
+        self._free.extend(range(capacity - 1, self.capacity - 1, -1))
+        self.capacity = capacity
+
+    def allocate(self):
+        """Reserve a slot for a new track and return its index."""
+        if not self._free:
+            self._grow(max(2 * self.capacity, 1))
+        return self._free.pop()
+
+    def release(self, slot):
+        """Return a slot to the free list."""
+        self.state[slot] = TrackState.Removed
+        self._free.append(slot)
+
+    def predict(self, slots, kalman_filter):
+        """Advance the Kalman state of all tracks in `slots` by one frame.
+
+        Tracks that are not in the `Tracked` state have their height velocity
+        zeroed before prediction, mirroring `STrack.predict`.
+        """
+        if len(slots) == 0:
+            return
+        mean = self.mean[slots]
+        mean[self.state[slots] != TrackState.Tracked, 7] = 0
+        self.mean[slots], self.covariance[slots] = kalman_filter.multi_predict(
+            mean, self.covariance[slots])
+
+    def update(self, slots, measurements, scores, classes, frame_id, kalman_filter):
+        """Correct all tracks in `slots` with their matched `measurements`
+        (Nx4, `(x, y, a, h)`) in one batched Kalman update and mark them as
+        tracked in frame `frame_id`, taking the score and class of the match.
+
+        Returns a boolean array flagging the tracks that were re-activated
+        from a non-tracked state, mirroring `STrack.re_activate`.
+        """
+        reactivated = self.state[slots] != TrackState.Tracked
+        if len(slots) == 0:
+            return reactivated
+        self.mean[slots], self.covariance[slots] = kalman_filter.multi_update(
+            self.mean[slots], self.covariance[slots], measurements)
+        self.tracklet_len[slots] = np.where(reactivated, 0, self.tracklet_len[slots] + 1)
+        self.state[slots] = TrackState.Tracked
+        self.is_activated[slots] = True
+        self.frame_id[slots] = frame_id
+        self.score[slots] = scores
+        self.obj_class[slots] = classes
+        return reactivated
+
+    def tlwh(self, slots):
+        """Boxes of the tracks in `slots` as an (N, 4) `(top left x, top left y,
+        width, height)` array."""
+        ret = self.mean[slots, :4].copy()
+        ret[:, 2] *= ret[:, 3]
+        ret[:, :2] -= ret[:, 2:] / 2
+        return ret
+
+    def tlbr(self, slots):
+        """Boxes of the tracks in `slots` as an (N, 4) `(min x, min y, max x,
+        max y)` array."""
+        ret = self.tlwh(slots)
+        ret[:, 2:] += ret[:, :2]
+        return ret
+
+
+class StoreField(object):
+    """
+    Track attribute that lives in the owning `TrackStore` once the track holds
+    a slot, and in the instance dict before activation or after removal.
+    """
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        if obj._slot is None:
+            return obj.__dict__[self.name]
+        value = getattr(obj._store, self.name)[obj._slot]
+        # Scalars come back as plain Python values, like the attributes they
+        # replace (e.g. track_id ends up in JSON event payloads).
+        return value.item() if isinstance(value, np.generic) else value
+
+    def __set__(self, obj, value):
+        if obj._slot is None:
+            obj.__dict__[self.name] = value
+        else:
+            getattr(obj._store, self.name)[obj._slot] = value
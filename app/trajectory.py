@@ -0,0 +1,92 @@
+import logging
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class TrajectoryStore(object):
+    """
+    The last `length` centers of up to `capacity` tracks, in one
+    preallocated (capacity, length, 2) array used as a ring buffer per
+    track, so memory does not grow with uptime.
+
+    Tracks get a slot on their first `append` and give it back on `evict`,
+    which the runners call with the ids the tracker removed. Should more
+    than `capacity` tracks be alive at once, the least recently updated
+    one is dropped to make room (counted in `overflowed`).
+    """
+
+    def __init__(self, capacity=1024, length=32):
+        self.capacity = capacity
+        self.length = length
+        self.points = np.zeros((capacity, length, 2), dtype=np.float32)
+        self.sizes = np.zeros(capacity, dtype=np.int64)    # points stored per slot
+        self.heads = np.zeros(capacity, dtype=np.int64)    # index of the newest point
+        self.updated = np.zeros(capacity, dtype=np.int64)  # frame of the last append
+        self.owners = np.full(capacity, -1, dtype=np.int64)  # track id per slot
+        self.frame = 0
+        self.overflowed = 0
+        self._slots = dict()  # track id -> slot
+        self._free = list(range(capacity - 1, -1, -1))
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, track_id):
+        return track_id in self._slots
+
+    def _slot(self, track_id, protected):
+        if not self._free:
+            # Full: reuse the slot of the stalest track not being appended to
+            updated = np.where(np.isin(self.owners, list(protected)), np.iinfo(np.int64).max,
+                               self.updated)
+            victim = int(self.owners[np.argmin(updated)])
+            logger.warning(f"Trajectory store full, dropping track {victim}")
+            self.overflowed += 1
+            self.evict([victim])
+        slot = self._free.pop()
+        self._slots[track_id] = slot
+        self.owners[slot] = track_id
+        self.sizes[slot] = 0
+        return slot
+
+    def append(self, ids, centers):
+        """Add a frame's (N, 2) `centers` to the trajectories of `ids`"""
+        self.frame += 1
+        if not len(ids):
+            return
+        protected = set(ids)
+        slots = np.array([self._slots.get(track_id) if track_id in self._slots
+                          else self._slot(track_id, protected) for track_id in ids],
+                         dtype=np.int64)
+        heads = (self.heads[slots] + 1) % self.length
+        self.heads[slots] = heads
+        self.points[slots, heads] = centers
+        self.sizes[slots] = np.minimum(self.sizes[slots] + 1, self.length)
+        self.updated[slots] = self.frame
+
+    def last(self, ids):
+        """Newest center of each of `ids` as (N, 2), and which ids have one"""
+        slots = np.array([self._slots.get(track_id, -1) for track_id in ids], dtype=np.int64)
+        known = slots >= 0
+        slots = slots[known]
+        return self.points[slots, self.heads[slots]].astype(np.float64), known
+
+    def trail(self, track_id):
+        """(n, 2) centers of `track_id`, oldest first"""
+        slot = self._slots.get(track_id)
+        if slot is None:
+            return np.empty((0, 2), dtype=np.float32)
+        size, head = self.sizes[slot], self.heads[slot]
+        return self.points[slot, (head - np.arange(size)[::-1]) % self.length]
+
+    def evict(self, ids):
+        """Free the slots of removed tracks"""
+        for track_id in ids:
+            slot = self._slots.pop(track_id, None)
+            if slot is not None:
+                self.sizes[slot] = 0
+                self.owners[slot] = -1
+                self._free.append(slot)
@@ -28,6 +28,14 @@ def has_crossed_line(prev_center, current_center, line):
     return False, ""
 
 
+def roi_from_line(line, margin):
+    """(x1, y1, x2, y2) bounding box of `line` grown by `margin` pixels on
+    every side; detectors clamp it to each frame"""
+    (lx1, ly1), (lx2, ly2) = line
+    return (int(min(lx1, lx2) - margin), int(min(ly1, ly2) - margin),
+            int(max(lx1, lx2) + margin), int(max(ly1, ly2) + margin))
+
+
 def prepare_osd_frames(frame, bbox, center, line, obj_id):
     cv2.rectangle(frame, (int(bbox[0]), int(bbox[1])), (int(bbox[2]), int(bbox[3])), (0, 255, 0), 2)
     cv2.putText(frame, f'#{obj_id}', (int(bbox[0]), int(bbox[1])),
@@ -46,13 +54,6 @@ def draw_tracking_bbox(frame, bbox, obj_id):
     return frame
 
 
-def update_obj_history(object_histories, object_id, center):
-    if object_id not in object_histories:
-        object_histories[object_id] = [center]
-    object_histories[object_id].append(center)
-    return object_histories
-
-
 def write_output_video(frames, output_path, fps=30, codec='mp4v'):
     """
     Write a list of frames to a video file.
@@ -0,0 +1,94 @@
+import logging
+import os
+import threading
+
+import cv2
+
+from pipeline import BoundedQueue, STOP
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class VideoSink(object):
+    """
+    Incremental video writer: frames are queued and encoded by a background
+    thread as they are produced, so memory stays bounded by `queue_size`
+    frames however long the stream runs.
+
+    With `segment_seconds` (video time) and/or `segment_bytes` set, output
+    rotates to a new file whenever the current one reaches either limit;
+    segments are named `<name>_0000<ext>`, `<name>_0001<ext>`, ... after
+    `output_path`. `backpressure` decides what `write` does when the
+    encoder falls behind (see pipeline.BoundedQueue).
+    """
+
+    def __init__(self, output_path, fps=30, codec='mp4v', queue_size=32,
+                 backpressure="block", segment_seconds=None, segment_bytes=None):
+        self.output_path = output_path
+        self.fps = fps
+        self.fourcc = cv2.VideoWriter_fourcc(*codec)
+        self.segment_frames = int(segment_seconds * fps) if segment_seconds else None
+        self.segment_bytes = segment_bytes
+        self.queue = BoundedQueue(queue_size, backpressure)
+        self.segments = list()
+        self.written = 0
+        self._writer = None
+        self._size = None
+        self._segment_written = 0
+        self._thread = threading.Thread(target=self._run, name="video-sink", daemon=True)
+        self._thread.start()
+
+    @property
+    def dropped(self):
+        return self.queue.dropped
+
+    def write(self, frame):
+        self.queue.put(frame)
+
+    def close(self):
+        """Flush the queued frames and finalise the current segment"""
+        self.queue.put(STOP)
+        self._thread.join()
+
+    def _segment_path(self):
+        if self.segment_frames is None and self.segment_bytes is None:
+            return self.output_path
+        base, ext = os.path.splitext(self.output_path)
+        return f"{base}_{len(self.segments):04d}{ext}"
+
+    def _open(self, frame):
+        height, width = frame.shape[:2]
+        path = self._segment_path()
+        self._writer = cv2.VideoWriter(path, self.fourcc, self.fps, (width, height))
+        self._size = (width, height)
+        self._segment_written = 0
+        self.segments.append(path)
+
+    def _release(self):
+        if self._writer is not None:
+            self._writer.release()
+            logger.info(f"Video saved at {self.segments[-1]}")
+            self._writer = None
+
+    def _segment_full(self):
+        if self.segment_frames is not None and self._segment_written >= self.segment_frames:
+            return True
+        return (self.segment_bytes is not None
+                and os.path.getsize(self.segments[-1]) >= self.segment_bytes)
+
+    def _run(self):
+        while True:
+            frame = self.queue.get()
+            if frame is STOP:
+                break
+            if self._writer is not None and self._segment_full():
+                self._release()
+            if self._writer is None:
+                self._open(frame)
+            if frame.shape[1::-1] != self._size:
+                frame = cv2.resize(frame, self._size)
+            self._writer.write(frame)
+            self._segment_written += 1
+            self.written += 1
+        self._release()
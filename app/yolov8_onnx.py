@@ -0,0 +1,94 @@
+import threading
+import logging
+import cv2
+import numpy as np
+from detector import Detector
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class YOLOv8ONNX(Detector):
+    """
+    CPU backend running the YOLOv8 ONNX export on ONNX Runtime or OpenCV DNN.
+
+    num_threads:      intra-op threads (ONNX Runtime) / cv2 worker threads
+                      (OpenCV); None leaves the library default.
+    inter_op_threads: ONNX Runtime inter-op threads.
+    providers:        ONNX Runtime execution providers, CPU by default.
+
+    batch_size > 1 needs a model exported with a dynamic batch axis.
+    """
+
+    def __init__(self,
+                 model_path,
+                 runtime="onnxruntime",
+                 num_threads=None,
+                 inter_op_threads=None,
+                 providers=None,
+                 **kwargs):
+        super().__init__(**kwargs)
+        if runtime not in ("onnxruntime", "opencv"):
+            raise ValueError(f"Unknown ONNX runtime: {runtime}")
+        if runtime == "onnxruntime" and ort is None:
+            raise ImportError("onnxruntime is not installed, "
+                              "use the opencv runtime or pip install onnxruntime")
+        self.model_path = model_path
+        self.runtime = runtime
+        self.num_threads = num_threads
+        self.inter_op_threads = inter_op_threads
+        self.providers = providers or ["CPUExecutionProvider"]
+        self.session = None
+        self._session_lock = threading.Lock()
+
+    def load_model(self):
+        """Create the ONNX Runtime session (shared) or this thread's OpenCV net"""
+        if self.runtime == "onnxruntime":
+            with self._session_lock:
+                if self.session is None:
+                    options = ort.SessionOptions()
+                    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+                    if self.num_threads is not None:
+                        options.intra_op_num_threads = self.num_threads
+                    if self.inter_op_threads is not None:
+                        options.inter_op_num_threads = self.inter_op_threads
+                    self.session = ort.InferenceSession(self.model_path,
+                                                        sess_options=options,
+                                                        providers=self.providers)
+                    self.input_name = self.session.get_inputs()[0].name
+                    self.output_name = self.session.get_outputs()[0].name
+                    logger.info(f"ONNX Runtime providers: {self.session.get_providers()}")
+        elif not hasattr(self.local_data, 'net'):
+            # cv2.dnn.Net is not thread-safe, keep one per thread
+            if self.num_threads is not None:
+                cv2.setNumThreads(self.num_threads)
+            net = cv2.dnn.readNetFromONNX(self.model_path)
+            net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+            net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+            self.local_data.net = net
+
+    def _forward(self, input_tensor):
+        """Run the network on a preprocessed tensor"""
+        if self.runtime == "onnxruntime":
+            if self.session is None:
+                self.load_model()
+            if not hasattr(self.local_data, 'io_binding'):
+                self.local_data.io_binding = self.session.io_binding()
+            # Bind this thread's buffers so the run allocates no host memory
+            output = self._output_buffer()[:len(input_tensor)]
+            io_binding = self.local_data.io_binding
+            io_binding.bind_cpu_input(self.input_name, input_tensor)
+            io_binding.bind_output(self.output_name, 'cpu', 0, np.float32,
+                                   output.shape, output.ctypes.data)
+            self.session.run_with_iobinding(io_binding)
+            return output
+
+        if not hasattr(self.local_data, 'net'):
+            self.load_model()
+        self.local_data.net.setInput(input_tensor)
+        return self.local_data.net.forward()
@@ -2,26 +2,17 @@
 import tensorrt as trt
 import pycuda.driver as cuda
 import numpy as np
-import threading
-import cv2
-
-
-class YOLOv8TensorRT:
-    def __init__(self,
-                 engine_path,
-                 original_shape=(720, 1280),
-                 input_shape=(1, 3, 640, 640),
-                 conf_threshold=0.3,
-                 iou_threshold=0.9,
-                 num_classes=80):
+from detector import Detector
+
+
+class YOLOv8TensorRT(Detector):
+    # Engines are built for a static input shape; set batch_size to the
+    # batch the engine was exported with.
+    fixed_batch = True
+
+    def __init__(self, engine_path, **kwargs):
+        super().__init__(**kwargs)
         self.engine_path = engine_path
-        self.local_data = threading.local()
-        self.input_shape = input_shape
-        self.output_shape = (1, num_classes+4, 8400)
-        self.original_shape = original_shape
-        self.conf_threshold = conf_threshold
-        self.iou_threshold = iou_threshold
-        self.num_classes = num_classes
 
     def load_model(self):
         """Initialize CUDA context and TensorRT resources for this thread"""
@@ -36,6 +27,10 @@ class YOLOv8TensorRT:
                 with open(self.engine_path, "rb") as f:
                     runtime = trt.Runtime(trt.Logger(trt.Logger.WARNING))
                     self.local_data.engine = runtime.deserialize_cuda_engine(f.read())
+                engine_batch = self.local_data.engine.get_binding_shape(0)[0]
+                if engine_batch != self.batch_size:
+                    raise ValueError(f"{self.engine_path} is built for batch {engine_batch}, "
+                                     f"not batch_size={self.batch_size}")
 
                 # Create execution context
                 self.local_data.trt_context = self.local_data.engine.create_execution_context()
@@ -58,17 +53,29 @@ class YOLOv8TensorRT:
 
         self.local_data.input_mem = cuda.mem_alloc(input_size)
         self.local_data.output_mem = cuda.mem_alloc(output_size)
+        self._output_buffer()
+
+    def _allocate_host(self, shape):
+        """Page-locked host buffers, so async copies skip the pageable staging copy"""
+        if not hasattr(self.local_data, 'cuda_context'):
+            self.load_model()
+        self.local_data.cuda_context.push()
+        try:
+            return cuda.pagelocked_empty(shape, dtype=np.float32)
+        finally:
+            self.local_data.cuda_context.pop()
 
-    def infer(self, frame):
-        """Perform inference on a frame"""
+    def _forward(self, input_tensor):
+        """Run the engine on a preprocessed tensor"""
         # Ensure model is initialized
         if not hasattr(self.local_data, 'is_initialized'):
             self.load_model()  # Auto-initialize if not already done
 
         try:
             self.local_data.cuda_context.push()
-            # Preprocess and copy to GPU
-            self.preprocess(frame, self.local_data.input_mem)
+            # Copy input to GPU
+            cuda.memcpy_htod_async(self.local_data.input_mem, input_tensor,
+                                   self.local_data.stream)
 
             # Run inference
             self.local_data.trt_context.execute_async_v2(
@@ -78,82 +85,19 @@ class YOLOv8TensorRT:
             )
 
             # Copy output from GPU
-            output = self._get_output()
-            return self.decode_output(output)
-            
+            return self._get_output()
+
         finally:
             self.local_data.cuda_context.pop()
 
-    def preprocess(self, frame, input_mem):
-        """Prepare input tensor and copy to GPU"""
-        # Example preprocessing
-        resized = cv2.resize(frame, (self.input_shape[3], self.input_shape[2]))
-        normalized = (resized / 255.0).astype(np.float32)
-        chw = normalized.transpose(2, 0, 1)  # HWC to CHW
-        host_input = np.ascontiguousarray(chw)
-        cuda.memcpy_htod_async(input_mem, host_input, self.local_data.stream)
-
     def _get_output(self):
         """Retrieve and postprocess output"""
-        host_output = np.empty(self.output_shape, dtype=np.float32)
+        host_output = self._output_buffer()
         cuda.memcpy_dtoh_async(host_output, self.local_data.output_mem,
                                self.local_data.stream)
         self.local_data.stream.synchronize()
         return host_output
 
-    def decode_output(self, output_tensor):
-        # Reshape the output tensor
-        output = output_tensor.squeeze(0)  # Shape: (84, 8400)
-        output = output.transpose(1, 0)    # Shape: (8400, 84)
-
-        # Split into bounding boxes and class probabilities
-        bbox_data = output[:, 0:4]    # (cx, cy, w, h) for 8400 anchors
-        cls_scores = output[:, 4:(self.num_classes+4)]  # Class probabilities (80 values per anchor)
-
-        # Convert bounding boxes to (x1, y1, x2, y2)
-        cx, cy, w, h = bbox_data[:, 0], bbox_data[:, 1], bbox_data[:, 2], bbox_data[:, 3]
-        x1 = cx - w / 2
-        y1 = cy - h / 2
-        x2 = cx + w / 2
-        y2 = cy + h / 2
-        boxes = np.stack([x1, y1, x2, y2], axis=1)
-
-        # Get confidence scores and class IDs
-        conf_scores = np.max(cls_scores, axis=1)  # Max class probability per anchor
-        class_ids = np.argmax(cls_scores, axis=1)
-
-        # Filter out low-confidence predictions
-        keep = conf_scores > self.conf_threshold
-        boxes = boxes[keep]
-        conf_scores = conf_scores[keep]
-        class_ids = class_ids[keep]
-
-        # Apply Non-Maximum Suppression (NMS)
-        nms_indices = cv2.dnn.NMSBoxes(
-            bboxes=boxes.tolist(),
-            scores=conf_scores.tolist(),
-            score_threshold=self.conf_threshold,
-            nms_threshold=self.iou_threshold,
-            top_k=1000
-        )
-
-        # Get final detections
-        final_boxes = boxes[nms_indices]
-        final_scores = conf_scores[nms_indices]
-        final_class_ids = class_ids[nms_indices]
-
-        return self.scale_boxes(final_boxes), final_scores, final_class_ids
-
-    def scale_boxes(self, boxes):
-        # original_shape: (height, width) of the original image
-        # model_input_shape: (height, width) used for inference
-        height_ratio = self.original_shape[0] / self.input_shape[2]
-        width_ratio = self.original_shape[1] / self.input_shape[3]
-        
-        boxes[:, [0, 2]] *= width_ratio   # Scale x coordinates
-        boxes[:, [1, 3]] *= height_ratio  # Scale y coordinates
-        return boxes.astype(int)  # Convert to integers
-
     def __del__(self):
         """Clean up resources"""
         if hasattr(self.local_data, 'cuda_context'):